@@ -120,25 +120,13 @@ def google_callback():
 import os
 from werkzeug.utils import secure_filename
 from app.auth.forms import EditProfileForm
+from app.main.blob_utils import store_blob, release_blob, blob_url, parse_blob_url, extension_of
 
-def save_picture(form_picture, folder='profile_pics'):
-    # Generate random hex to avoid filename collisions
-    random_hex = os.urandom(8).hex()
-    _, f_ext = os.path.splitext(form_picture.filename)
-    picture_fn = random_hex + f_ext
-    
-
-    upload_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static', 'uploads', folder)
-    
-
-    if not os.path.exists(upload_path):
-        os.makedirs(upload_path)
-        
-    picture_path = os.path.join(upload_path, picture_fn)
-    form_picture.save(picture_path)
-    
-
-    return url_for('static', filename=f'uploads/{folder}/{picture_fn}')
+def save_picture(form_picture, old_url=None):
+    # Stored once by content hash; the same photo uploaded twice shares one file
+    sha256 = store_blob(form_picture)
+    release_blob(parse_blob_url(old_url))
+    return blob_url(sha256, extension_of(form_picture.filename))
 
 @bp.route('/edit_profile', methods=['GET', 'POST'])
 @login_required
@@ -149,11 +137,11 @@ def edit_profile():
         
         
         if form.profile_photo.data:
-            picture_file = save_picture(form.profile_photo.data, 'profile_pics')
+            picture_file = save_picture(form.profile_photo.data, current_user.profile_photo)
             current_user.profile_photo = picture_file
             
         if form.cover_photo.data:
-            cover_file = save_picture(form.cover_photo.data, 'profile_pics') 
+            cover_file = save_picture(form.cover_photo.data, current_user.cover_photo)
             current_user.cover_photo = cover_file
             
         db.session.commit()
@@ -1,3 +1,3 @@
 from flask import Blueprint
 bp = Blueprint('main', __name__)
-from app.main import routes, inventory_routes, cart_routes, checkout_routes, inventory_forms, supplier_routes, search_routes, upload_routes, featured_books_routes, ebook_routes
+from app.main import routes, inventory_routes, cart_routes, checkout_routes, inventory_forms, supplier_routes, search_routes, upload_routes, featured_books_routes, ebook_routes, mail_utils, circulation_utils, circulation_routes, import_utils, export_routes, stock_utils, supplier_utils, forecast_utils, analytics_utils, purchase_order_utils, ebook_utils, pdf_utils, upload_session_utils, blob_utils, blob_routes, audio_utils, ebook_search_utils, progress_utils, cover_utils, placeholder_utils, placeholder_routes
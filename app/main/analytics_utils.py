@@ -0,0 +1,149 @@
+from collections import defaultdict
+from datetime import date
+import click
+from sqlalchemy import select, insert, update, delete, func, case
+from sqlalchemy.exc import IntegrityError
+from app.extensions import db
+from app.main import bp
+from app.models import Book, SupplyOrder, SupplyOrderItem, SupplierStats, SupplierMonthlyStats
+
+PLACED_COUNTERS = ('orders_placed', 'units_ordered', 'spend')
+COMPLETED_COUNTERS = ('orders_completed', 'units_due', 'units_received', 'lines_received', 'lines_short',
+                      'lead_time_days')
+TREND_MONTHS = 12
+
+def month_of(when):
+    return when.date().replace(day=1)
+
+def _bump(model, key, deltas):
+    """
+    Adds deltas to one rollup row in the caller's transaction, creating the
+    row on first use. The increment happens in SQL, so concurrent orders for
+    the same supplier never overwrite each other.
+    """
+    increments = {name: getattr(model, name) + value for name, value in deltas.items()}
+    stmt = update(model).filter_by(**key).values(**increments)
+    if db.session.execute(stmt, execution_options={'synchronize_session': False}).rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(model).values(**key, **deltas))
+    except IntegrityError:
+        # Another order created the row first
+        db.session.execute(stmt, execution_options={'synchronize_session': False})
+
+def _bump_rollups(supplier_id, when, deltas):
+    _bump(SupplierStats, {'supplier_id': supplier_id}, deltas)
+    _bump(SupplierMonthlyStats, {'supplier_id': supplier_id, 'month': month_of(when)}, deltas)
+
+def _order_totals(order_ids):
+    """Per-order line aggregates, one GROUP BY over supply_order_items."""
+    received = func.coalesce(SupplyOrderItem.payload, 0)
+    return {
+        row.order_id: row for row in db.session.execute(
+            select(
+                SupplyOrderItem.order_id,
+                func.count(SupplyOrderItem.id).label('lines'),
+                func.coalesce(func.sum(SupplyOrderItem.mass), 0).label('units'),
+                func.coalesce(func.sum(SupplyOrderItem.mass * Book.price), 0).label('spend'),
+                func.coalesce(func.sum(received), 0).label('received'),
+                func.coalesce(func.sum(case((received < SupplyOrderItem.mass, 1), else_=0)), 0).label('short'),
+            )
+            .join(Book, Book.id == SupplyOrderItem.book_id)
+            .where(SupplyOrderItem.order_id.in_(order_ids))
+            .group_by(SupplyOrderItem.order_id)
+        )
+    }
+
+def _placed_deltas(totals):
+    return {'orders_placed': 1, 'units_ordered': totals.units, 'spend': float(totals.spend)}
+
+def _completed_deltas(totals, placed_at, completed_at):
+    lead_time = (completed_at - placed_at).total_seconds() / 86400 if placed_at else 0.0
+    return {
+        'orders_completed': 1,
+        'units_due': totals.units,
+        'units_received': totals.received,
+        'lines_received': totals.lines,
+        'lines_short': totals.short,
+        'lead_time_days': lead_time,
+    }
+
+def record_order_placed(order_id, supplier_id, placed_at):
+    """Adds a newly placed order to its supplier's rollups."""
+    totals = _order_totals([order_id]).get(order_id)
+    if totals:
+        _bump_rollups(supplier_id, placed_at, _placed_deltas(totals))
+
+def record_order_completed(order_id, supplier_id, placed_at, completed_at):
+    """Adds a fused order's delivery to its supplier's rollups."""
+    totals = _order_totals([order_id]).get(order_id)
+    if totals:
+        _bump_rollups(supplier_id, completed_at, _completed_deltas(totals, placed_at, completed_at))
+
+def rebuild_supplier_stats():
+    """
+    Recomputes both rollup tables from the orders themselves, for the first
+    deployment or after fixing order data by hand. Orders that were placed
+    without a supplier are left out. Returns the number of orders counted.
+    """
+    orders = db.session.execute(
+        select(SupplyOrder.id, SupplyOrder.supplier_id, SupplyOrder.placed_at, SupplyOrder.completed_at)
+        .where(SupplyOrder.supplier_id.is_not(None), SupplyOrder.placed_at.is_not(None))
+    ).all()
+    totals = _order_totals([order.id for order in orders])
+
+    overall = defaultdict(lambda: defaultdict(float))
+    monthly = defaultdict(lambda: defaultdict(float))
+    for order in orders:
+        if order.id not in totals:
+            continue
+        events = [(order.placed_at, _placed_deltas(totals[order.id]))]
+        if order.completed_at:
+            events.append((order.completed_at,
+                           _completed_deltas(totals[order.id], order.placed_at, order.completed_at)))
+        for when, deltas in events:
+            for name, value in deltas.items():
+                overall[order.supplier_id][name] += value
+                monthly[(order.supplier_id, month_of(when))][name] += value
+
+    def row(counters):
+        return {name: counters.get(name, 0) if name in ('spend', 'lead_time_days') else int(counters.get(name, 0))
+                for name in PLACED_COUNTERS + COMPLETED_COUNTERS}
+
+    db.session.execute(delete(SupplierMonthlyStats))
+    db.session.execute(delete(SupplierStats))
+    if overall:
+        db.session.execute(insert(SupplierStats), [
+            dict(row(counters), supplier_id=supplier_id) for supplier_id, counters in overall.items()
+        ])
+        db.session.execute(insert(SupplierMonthlyStats), [
+            dict(row(counters), supplier_id=supplier_id, month=month)
+            for (supplier_id, month), counters in monthly.items()
+        ])
+    db.session.commit()
+    return len(totals)
+
+def supplier_trends(months=TREND_MONTHS, today=None):
+    """
+    (month list, {supplier_id: {month: SupplierMonthlyStats}}) for the last
+    `months` calendar months, oldest first, read from the monthly rollup.
+    """
+    today = today or date.today()
+    month_list = []
+    year, month = today.year, today.month
+    for _ in range(months):
+        month_list.append(date(year, month, 1))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    month_list.reverse()
+
+    trends = defaultdict(dict)
+    for stats in SupplierMonthlyStats.query.filter(SupplierMonthlyStats.month >= month_list[0]):
+        trends[stats.supplier_id][stats.month] = stats
+    return month_list, trends
+
+@bp.cli.command('rebuild-supplier-stats')
+def rebuild_supplier_stats_command():
+    """Recompute the supplier analytics rollups from all placed orders."""
+    counted = rebuild_supplier_stats()
+    click.echo(f'{counted} order(s) rolled up.')
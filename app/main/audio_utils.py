@@ -0,0 +1,238 @@
+import os
+import json
+import mmap
+import base64
+import struct
+import tempfile
+from bisect import bisect_right
+import click
+from flask import current_app
+from app.extensions import db
+from app.main import bp
+from app.models import EBook
+from app.main.ebook_utils import media_path
+from app.tasks import submit
+
+# Kbps by bitrate index, per (MPEG-1?, layer)
+BITRATES = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+VBR_TAGS = (b'Xing', b'Info', b'VBRI')
+COPY_BLOCK = 64 * 1024
+
+def index_path(audio_path):
+    """The seek index lives beside the audio file it describes."""
+    return audio_path + '.seek.json'
+
+def parse_timestamp(value):
+    """Seconds from '5025', '5025.5', '83:45' or '1:23:45'; None if malformed."""
+    try:
+        seconds = 0.0
+        for part in str(value).strip().split(':'):
+            seconds = seconds * 60 + float(part)
+    except ValueError:
+        return None
+    return seconds if seconds >= 0 else None
+
+def _frame(data, offset):
+    """(length, samples, sample_rate) of the MPEG audio frame header at offset, or None."""
+    if offset + 4 > len(data):
+        return None
+    header = int.from_bytes(data[offset:offset + 4], 'big')
+    version = (header >> 19) & 3
+    layer = 4 - ((header >> 17) & 3)
+    bitrate_index = (header >> 12) & 15
+    rate_index = (header >> 10) & 3
+    if (header >> 21) != 0x7FF or version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        # Free-format streams (bitrate index 0) are not indexed
+        return None
+    mpeg1 = version == 3
+    bitrate = BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version][rate_index]
+    padding = (header >> 9) & 1
+    if layer == 1:
+        return (12 * bitrate // sample_rate + padding) * 4, 384, sample_rate
+    if layer == 3 and not mpeg1:
+        return 72 * bitrate // sample_rate + padding, 576, sample_rate
+    return 144 * bitrate // sample_rate + padding, 1152, sample_rate
+
+def _mp3_bounds(data):
+    """Byte range holding audio frames, past any ID3v2 tag and before any ID3v1 tag."""
+    start = 0
+    if data[:3] == b'ID3' and len(data) >= 10:
+        size = 0
+        for byte in data[6:10]:
+            size = (size << 7) | (byte & 0x7F)
+        start = 10 + size + (10 if data[5] & 0x10 else 0)
+    end = len(data)
+    if end >= 128 and data[end - 128:end - 125] == b'TAG':
+        end -= 128
+    return start, end
+
+def mp3_frames(data, start, end):
+    """
+    Yields (offset, samples, sample_rate) for each frame between start and
+    end. Where the stream is damaged it skips ahead to the next spot where
+    two valid headers follow each other, so stray 0xFF bytes never sync.
+    """
+    offset = start
+    synced = False
+    while offset + 4 <= end:
+        frame = _frame(data, offset)
+        if frame and not synced:
+            following = offset + frame[0]
+            synced = following + 4 > end or _frame(data, following) is not None
+        if not frame or not synced:
+            synced = False
+            offset = data.find(b'\xff', offset + 1, end)
+            if offset < 0:
+                return
+            continue
+        yield offset, frame[1], frame[2]
+        offset += frame[0]
+
+def _mp3_index(data, interval):
+    start, end = _mp3_bounds(data)
+    points = []
+    elapsed = 0.0
+    next_point = 0.0
+    first = True
+    for offset, samples, sample_rate in mp3_frames(data, start, end):
+        if first:
+            first = False
+            frame_end = offset + _frame(data, offset)[0]
+            if any(data.find(tag, offset, frame_end) >= 0 for tag in VBR_TAGS):
+                # A VBR header frame: metadata for decoders, no audio
+                continue
+        if elapsed >= next_point:
+            points.append([round(elapsed, 4), offset])
+            next_point += interval
+        elapsed += samples / sample_rate
+    if not points:
+        return None
+    return {'format': 'mp3', 'duration': round(elapsed, 4), 'data_end': end, 'points': points}
+
+def _wav_index(data):
+    if data[:4] != b'RIFF' or data[8:12] != b'WAVE':
+        return None
+    offset, fmt = 12, None
+    while offset + 8 <= len(data):
+        chunk, size = data[offset:offset + 4], struct.unpack('<I', data[offset + 4:offset + 8])[0]
+        body = offset + 8
+        if chunk == b'fmt ':
+            fmt = bytes(data[body:body + size])
+        elif chunk == b'data' and fmt:
+            # Streamed recordings often leave the size unset; trust the file length then
+            end = min(body + size, len(data))
+            byte_rate, block_align = struct.unpack('<IH', fmt[8:14])
+            if not byte_rate or not block_align:
+                return None
+            return {
+                'format': 'wav',
+                'duration': round((end - body) / byte_rate, 4),
+                'data_start': body,
+                'data_end': end,
+                'byte_rate': byte_rate,
+                'block_align': block_align,
+                'fmt': base64.b64encode(fmt).decode(),
+            }
+        offset = body + size + (size & 1)
+    return None
+
+def build_audio_index(ebook_id):
+    """
+    Reads an e-book's audio once and writes its seek index beside it: for
+    MP3, the time and byte offset of a frame every AUDIO_SEEK_INTERVAL
+    seconds; for WAV, where the samples start and how wide they are. Pure
+    Python over a memory map, so large files are never loaded whole.
+    Returns the duration in seconds, or None if the file can't be indexed.
+    """
+    ebook = db.session.get(EBook, ebook_id)
+    path = media_path(ebook, 'audio') if ebook else None
+    if path is None or os.path.getsize(path) == 0:
+        return None
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        if data[:4] == b'RIFF':
+            index = _wav_index(data)
+        else:
+            index = _mp3_index(data, current_app.config['AUDIO_SEEK_INTERVAL'])
+    if index is None:
+        current_app.logger.warning(f"Could not index the audio of e-book #{ebook_id}")
+        return None
+
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+    with os.fdopen(fd, 'w') as out:
+        json.dump(index, out, separators=(',', ':'))
+    os.replace(tmp, index_path(path))
+    return index['duration']
+
+def index_ebook_audio(ebook_id):
+    """Builds the seek index on the background pool; call after the upload commits."""
+    return submit(build_audio_index, ebook_id)
+
+def load_audio_index(path):
+    try:
+        with open(index_path(path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def locate(path, index, seconds):
+    """
+    (time, byte offset) of the frame playing at `seconds`. The index gets
+    within AUDIO_SEEK_INTERVAL; the rest is a short walk over frame headers.
+    """
+    seconds = min(max(seconds, 0.0), index['duration'])
+    if index['format'] == 'wav':
+        blocks = int(seconds * index['byte_rate']) // index['block_align']
+        offset = min(index['data_start'] + blocks * index['block_align'], index['data_end'])
+        return (offset - index['data_start']) / index['byte_rate'], offset
+
+    points = index['points']
+    elapsed, offset = points[max(bisect_right([point[0] for point in points], seconds) - 1, 0)]
+    if elapsed >= seconds:
+        return elapsed, offset
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        for frame_offset, samples, sample_rate in mp3_frames(data, offset, index['data_end']):
+            duration = samples / sample_rate
+            if elapsed + duration > seconds:
+                return elapsed, frame_offset
+            elapsed += duration
+    return index['duration'], index['data_end']
+
+def wav_header(index, data_size):
+    """A RIFF header for a slice of a WAV file's samples, reusing its format chunk."""
+    fmt = base64.b64decode(index['fmt'])
+    return (b'RIFF' + struct.pack('<I', 4 + 8 + len(fmt) + 8 + data_size) + b'WAVE'
+            + b'fmt ' + struct.pack('<I', len(fmt)) + fmt
+            + b'data' + struct.pack('<I', data_size))
+
+def read_range(path, start, end):
+    """Yields the bytes of path[start:end] a block at a time."""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = f.read(min(COPY_BLOCK, remaining))
+            if not block:
+                return
+            remaining -= len(block)
+            yield block
+
+@bp.cli.command('index-ebook-audio')
+@click.option('--all', 'reindex', is_flag=True, help='Rebuild indexes that already exist.')
+def index_ebook_audio_command(reindex):
+    """Build seek indexes for audiobooks uploaded before they existed."""
+    indexed = 0
+    for ebook in EBook.query.filter(EBook.audio_path.is_not(None)).all():
+        path = media_path(ebook, 'audio')
+        if path and (reindex or not os.path.exists(index_path(path))):
+            if build_audio_index(ebook.id) is not None:
+                indexed += 1
+    click.echo(f'{indexed} audiobook(s) indexed.')
@@ -0,0 +1,46 @@
+from flask import current_app, send_file, abort, redirect
+from flask_login import current_user
+from app.extensions import db, login_manager
+from app.main import bp
+from app.models import Blob
+from app.main.blob_utils import blob_path, blob_url
+from app.main.cover_utils import variant_path, queue_variants
+import os
+
+@bp.route('/blobs/<sha256>.<extension>')
+def blob(sha256, extension):
+    stored = db.session.get(Blob, sha256)
+    if stored is None or not os.path.isfile(blob_path(sha256)):
+        abort(404)
+    # Covers and photos are public; e-book PDFs and audio still need a login
+    public = stored.content_type.startswith('image/')
+    if not public and not current_user.is_authenticated:
+        return login_manager.unauthorized()
+
+    # The URL is the content's hash, so it can be cached for good and never revalidated
+    response = send_file(blob_path(sha256), mimetype=stored.content_type,
+                         conditional=True, etag=sha256, max_age=current_app.config['BLOB_MAX_AGE'])
+    response.cache_control.immutable = True
+    response.cache_control.public = public
+    response.cache_control.private = not public
+    response.headers['Accept-Ranges'] = 'bytes'
+    return response
+
+@bp.route('/blobs/<sha256>/w<int:width>.<any(jpg, webp):fmt>')
+def blob_variant(sha256, width, fmt):
+    stored = db.session.get(Blob, sha256)
+    # Only the configured sizes, so nobody can make the server render arbitrary ones
+    if (stored is None or not stored.content_type.startswith('image/') or
+            width not in current_app.config['COVER_WIDTHS'] or not os.path.isfile(blob_path(sha256))):
+        abort(404)
+    path = variant_path(sha256, width, fmt)
+    if not os.path.exists(path):
+        # Not rendered yet: queue it and send the original meanwhile, through an uncached redirect
+        original = blob_url(sha256, stored.content_type.split('/')[-1])
+        queue_variants(original)
+        return redirect(original)
+    response = send_file(path, mimetype='image/webp' if fmt == 'webp' else 'image/jpeg', conditional=True,
+                         etag=f'{sha256}-w{width}.{fmt}', max_age=current_app.config['BLOB_MAX_AGE'])
+    response.cache_control.immutable = True
+    response.cache_control.public = True
+    return response
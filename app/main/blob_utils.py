@@ -0,0 +1,180 @@
+import os
+import re
+import glob
+import hashlib
+import tempfile
+from datetime import datetime, timedelta
+import click
+from flask import current_app, url_for
+from sqlalchemy import select, update, delete, insert, case
+from sqlalchemy.exc import IntegrityError
+from app.extensions import db
+from app.main import bp
+from app.models import Blob
+
+COPY_BLOCK = 64 * 1024
+BLOB_NAME = re.compile(r'^([0-9a-f]{64})\.([a-z0-9]{1,10})$')
+BLOB_URL = re.compile(r'/blobs/([0-9a-f]{64})\.[a-z0-9]{1,10}$')
+CONTENT_TYPES = {
+    'pdf': 'application/pdf', 'mp3': 'audio/mpeg', 'wav': 'audio/wav',
+    'jpg': 'image/jpeg', 'jpeg': 'image/jpeg', 'png': 'image/png', 'gif': 'image/gif', 'webp': 'image/webp',
+}
+
+def blob_path(sha256):
+    # Two levels of fan-out keep directories small
+    return os.path.join(current_app.config['BLOB_FOLDER'], sha256[:2], sha256[2:4], sha256)
+
+def extension_of(filename):
+    return filename.rsplit('.', 1)[-1].lower() if filename and '.' in filename else 'bin'
+
+def blob_name(sha256, extension):
+    """What the e-book columns store for a blob: '<sha256>.<ext>'."""
+    return f'{sha256}.{extension}'
+
+def parse_blob_name(name):
+    """The hash in a stored blob name, or None for a legacy filename."""
+    match = BLOB_NAME.match(name or '')
+    return match.group(1) if match else None
+
+def blob_url(sha256, extension):
+    return url_for('main.blob', sha256=sha256, extension=extension)
+
+def parse_blob_url(url):
+    """The hash in a /blobs/ URL, or None for a static, external or placeholder URL."""
+    match = BLOB_URL.search(url or '')
+    return match.group(1) if match else None
+
+def _reference(sha256, size, content_type):
+    """Counts one more reference to a blob, creating its row on first use. Does not commit."""
+    stmt = (update(Blob).where(Blob.sha256 == sha256)
+            .values(refcount=Blob.refcount + 1, released_at=None))
+    if db.session.execute(stmt, execution_options={'synchronize_session': False}).rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(Blob).values(sha256=sha256, size=size, content_type=content_type,
+                                                   refcount=1))
+    except IntegrityError:
+        # The same bytes were stored by another request first
+        db.session.execute(stmt, execution_options={'synchronize_session': False})
+
+def _adopt(tmp_path, digest, size, extension):
+    path = blob_path(digest)
+    # The row first: it waits out a gc-blobs run on the same blob, so the file placed next is never collected
+    _reference(digest, size, CONTENT_TYPES.get(extension, 'application/octet-stream'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Identical bytes either way, so replacing an existing copy is harmless and atomic
+    os.replace(tmp_path, path)
+    return digest
+
+def store_blob(file, filename=None):
+    """
+    Streams an uploaded file into the blob store, hashing it on the way, and
+    returns its SHA-256. Storing bytes that are already there costs no disk;
+    the blob just gains a reference. Does not commit.
+    """
+    filename = filename or file.filename
+    folder = os.path.join(current_app.config['BLOB_FOLDER'], 'tmp')
+    os.makedirs(folder, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    stream = getattr(file, 'stream', file)
+    fd, tmp = tempfile.mkstemp(dir=folder)
+    with os.fdopen(fd, 'wb') as out:
+        for block in iter(lambda: stream.read(COPY_BLOCK), b''):
+            digest.update(block)
+            size += len(block)
+            out.write(block)
+    return _adopt(tmp, digest.hexdigest(), size, extension_of(filename))
+
+def store_blob_file(path, filename=None, move=False):
+    """store_blob for a file already on disk; `move` hands the file itself over."""
+    if not move:
+        with open(path, 'rb') as f:
+            return store_blob(f, filename or path)
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(COPY_BLOCK), b''):
+            digest.update(block)
+    return _adopt(path, digest.hexdigest(), os.path.getsize(path), extension_of(filename or path))
+
+def retain_blob(sha256, count=1):
+    """
+    Counts `count` more references to a blob that is already stored, as when
+    a /blobs/ URL is copied onto another row. Unknown hashes are ignored.
+    Does not commit.
+    """
+    if not sha256:
+        return
+    db.session.execute(
+        update(Blob).where(Blob.sha256 == sha256).values(refcount=Blob.refcount + count, released_at=None),
+        execution_options={'synchronize_session': False},
+    )
+
+def repoint_blob_url(old_url, new_url):
+    """
+    Moves a column's claim from one URL to another. The new blob gains its
+    reference before the old one loses its own, so keeping or copying a URL
+    never drops a count to zero. Other URLs are left alone. Does not commit.
+    """
+    if old_url == new_url:
+        return
+    retain_blob(parse_blob_url(new_url))
+    release_blob(parse_blob_url(old_url))
+
+def release_blob(sha256):
+    """
+    Drops one reference. The file stays on disk until `flask main gc-blobs`
+    finds the blob unreferenced past BLOB_GC_GRACE_HOURS, so a delete can
+    never pull bytes from under another e-book or a request in flight.
+    Does not commit.
+    """
+    if not sha256:
+        return
+    db.session.execute(
+        update(Blob).where(Blob.sha256 == sha256, Blob.refcount > 0)
+        .values(refcount=Blob.refcount - 1,
+                released_at=case((Blob.refcount == 1, datetime.utcnow()), else_=Blob.released_at)),
+        execution_options={'synchronize_session': False},
+    )
+
+@bp.cli.command('gc-blobs')
+def gc_blobs_command():
+    """Delete blobs nothing has referenced for BLOB_GC_GRACE_HOURS."""
+    cutoff = datetime.utcnow() - timedelta(hours=current_app.config['BLOB_GC_GRACE_HOURS'])
+    candidates = db.session.execute(
+        select(Blob.sha256).where(Blob.refcount <= 0, Blob.released_at < cutoff)
+    ).scalars().all()
+    trash = os.path.join(current_app.config['BLOB_FOLDER'], 'tmp')
+    os.makedirs(trash, exist_ok=True)
+    collected = freed = 0
+    for sha256 in candidates:
+        # One guarded delete per blob; a blob re-referenced meanwhile no longer matches
+        deleted = db.session.execute(
+            delete(Blob).where(Blob.sha256 == sha256, Blob.refcount <= 0, Blob.released_at < cutoff)
+            .returning(Blob.sha256)
+        ).scalar()
+        if deleted is None:
+            db.session.rollback()
+            continue
+        # Moved aside while the delete still holds the row, so a store_blob of the same bytes
+        # (which claims the row before placing its file) can't have its new copy removed
+        path = blob_path(sha256)
+        moved = []
+        for derived in [path] + glob.glob(glob.escape(path) + '.*'):
+            if os.path.exists(derived):
+                aside = os.path.join(trash, f'gc-{os.path.basename(derived)}')
+                os.replace(derived, aside)
+                moved.append((derived, aside))
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            for derived, aside in moved:
+                os.replace(aside, derived)
+            raise
+        collected += 1
+        for _, aside in moved:
+            freed += os.path.getsize(aside)
+            os.remove(aside)
+    click.echo(f'{collected} blob(s) deleted, {freed // 1024} KB freed.')
@@ -7,6 +7,9 @@ from app.models import Book, Sale, Loan, Discount
 from flask_mail import Message
 from app.extensions import mail
 from flask import current_app
+from sqlalchemy.orm.exc import StaleDataError
+from app.main.stock_utils import movement, record_movements
+from app.main.supplier_utils import crossed_threshold, reorder_points, populate_shortlist
 
 @bp.route('/checkout/review', methods=['POST'])
 @login_required
@@ -81,6 +84,9 @@ def confirm_checkout():
     all_items = cart.items.all()
     items = [item for item in all_items if str(item.id) in selected_ids]
     errors = []
+    movements = []
+    low_stock_ids = set()
+    points = reorder_points([item.book_id for item in items])
     
     for item in items:
         book = item.book
@@ -89,6 +95,8 @@ def confirm_checkout():
         if book.stock_available < item.quantity:
             errors.append(f'Not enough stock for {book.title}')
             continue
+        if crossed_threshold(book.stock_available, book.stock_available - item.quantity, points[book.id]):
+            low_stock_ids.add(book.id)
             
         if item.action == 'buy':
             # Calculate Price with Discounts
@@ -117,6 +125,8 @@ def confirm_checkout():
             # Update Stock
             book.stock_sold += item.quantity
             book.stock_available -= item.quantity
+            movements.append(movement(book.id, 'sale', available=-item.quantity,
+                                      sold=item.quantity, user_id=current_user.id))
             
         elif item.action == 'borrow':
             # Create Loan Record
@@ -128,6 +138,8 @@ def confirm_checkout():
             # Update Stock
             book.stock_borrowed += item.quantity
             book.stock_available -= item.quantity
+            movements.append(movement(book.id, 'loan', available=-item.quantity,
+                                      borrowed=item.quantity, user_id=current_user.id))
             
     if errors:
         for e in errors:
@@ -138,7 +150,15 @@ def confirm_checkout():
     for item in items:
         db.session.delete(item)
     
-    db.session.commit()
+    record_movements(movements)
+    try:
+        populate_shortlist(low_stock_ids)
+        db.session.commit()
+    except StaleDataError:
+        # Another checkout or staff edit touched one of these books first
+        db.session.rollback()
+        flash('Stock changed while placing your order. Please review your cart and try again.', 'warning')
+        return redirect(url_for('main.view_cart'))
     
     # Send Confirmation Email
     try:
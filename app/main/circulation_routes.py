@@ -0,0 +1,35 @@
+import re
+from flask import render_template, redirect, url_for, flash, request, jsonify
+from flask_login import login_required, current_user
+from app.main import bp
+from app.decorators import staff_required
+from app.main.circulation_utils import return_loans
+
+@bp.route('/circulation/return', methods=['GET', 'POST'])
+@login_required
+@staff_required
+def return_books():
+    if request.method == 'POST':
+        # Scanner clients post JSON, the desk form posts one code per line
+        if request.is_json:
+            data = request.get_json()
+            if not isinstance(data, dict) or not isinstance(data.get('codes') or [], list):
+                return jsonify({'success': False, 'errors': ['Send a JSON object with a list of codes.']}), 400
+            codes = [str(code) for code in (data.get('codes') or [])]
+        else:
+            codes = re.split(r'[\s,]+', request.form.get('codes', ''))
+
+        returned, unmatched = return_loans(codes, user_id=current_user.id)
+
+        if request.is_json:
+            return jsonify({'success': True, 'returned': returned, 'unmatched': unmatched})
+
+        if returned:
+            flash(f'{returned} book(s) returned and back in stock.', 'success')
+        if unmatched:
+            flash(f'No open loan found for: {", ".join(unmatched)}', 'warning')
+        if not returned and not unmatched:
+            flash('Scan at least one book or loan code.', 'warning')
+        return redirect(url_for('main.return_books'))
+
+    return render_template('circulation/return.html')
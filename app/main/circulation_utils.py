@@ -0,0 +1,210 @@
+from collections import Counter
+from datetime import datetime, timedelta
+import re
+import click
+from flask import current_app
+from sqlalchemy import select, update, case
+from app.extensions import db
+from app.main import bp
+from app.models import Loan, User, Book
+from app.main.mail_utils import enqueue_emails
+from app.main.stock_utils import movement, record_movements
+
+def _claim_loans(criteria, values, batch_size):
+    """
+    Claims one batch of loans matching `criteria` by updating them to `values`.
+    The UPDATE repeats the criteria, so a loan another sweeper already moved
+    is not returned twice and never gets a second email.
+    """
+    ids = db.session.scalars(
+        select(Loan.id).where(*criteria).order_by(Loan.due_date).limit(batch_size)
+    ).all()
+    if not ids:
+        return [], 0
+
+    claimed = db.session.scalars(
+        update(Loan).where(Loan.id.in_(ids), *criteria).values(**values)
+        .returning(Loan.id),
+        execution_options={'synchronize_session': False}
+    ).all()
+    if not claimed:
+        return [], len(ids)
+
+    rows = db.session.execute(
+        select(Loan.due_date, User.email, User.username, Book.title)
+        .join(User, User.id == Loan.user_id)
+        .join(Book, Book.id == Loan.book_id)
+        .where(Loan.id.in_(claimed))
+    ).all()
+    return rows, len(ids)
+
+def sweep_overdue_loans(now=None, batch_size=None):
+    """
+    Moves active loans past their due date to 'overdue' and queues one notice
+    per loan. Each batch is its own short transaction; running it again only
+    finds loans that became overdue since the last run.
+    """
+    now = now or datetime.utcnow()
+    batch_size = batch_size or current_app.config['LOAN_SWEEP_BATCH_SIZE']
+    criteria = (Loan.status == 'active', Loan.due_date < now)
+    total = 0
+
+    while True:
+        rows, scanned = _claim_loans(criteria, {'status': 'overdue'}, batch_size)
+        enqueue_emails(
+            {
+                'recipient': row.email,
+                'subject': f'Overdue: {row.title} - ChupChap Pathshala',
+                'body': f'''Hello {row.username},
+
+Our records show that "{row.title}" was due on {row.due_date:%d %B %Y} and has not been returned yet.
+Please return it to the library as soon as possible.
+
+Best regards,
+ChupChap Pathshala Team
+''',
+            }
+            for row in rows
+        )
+        db.session.commit()
+        total += len(rows)
+        if scanned < batch_size:
+            break
+
+    return total
+
+def queue_due_reminders(now=None, batch_size=None):
+    """
+    Queues a reminder for active loans due within LOAN_REMINDER_DAYS.
+    reminder_sent_at marks a loan as handled, so each loan is reminded once.
+    """
+    now = now or datetime.utcnow()
+    batch_size = batch_size or current_app.config['LOAN_SWEEP_BATCH_SIZE']
+    horizon = now + timedelta(days=current_app.config['LOAN_REMINDER_DAYS'])
+    criteria = (
+        Loan.status == 'active',
+        Loan.due_date >= now,
+        Loan.due_date < horizon,
+        Loan.reminder_sent_at.is_(None),
+    )
+    total = 0
+
+    while True:
+        rows, scanned = _claim_loans(criteria, {'reminder_sent_at': now}, batch_size)
+        enqueue_emails(
+            {
+                'recipient': row.email,
+                'subject': f'Reminder: {row.title} is due soon - ChupChap Pathshala',
+                'body': f'''Hello {row.username},
+
+This is a friendly reminder that "{row.title}" is due on {row.due_date:%d %B %Y}.
+
+Best regards,
+ChupChap Pathshala Team
+''',
+            }
+            for row in rows
+        )
+        db.session.commit()
+        total += len(rows)
+        if scanned < batch_size:
+            break
+
+    return total
+
+OPEN_LOAN_STATUSES = ('active', 'overdue')
+SCAN_CODE_RE = re.compile(r'^([LB]?)(\d+)$', re.IGNORECASE)
+
+def parse_scan_codes(codes):
+    """
+    Splits scanned barcodes into loan ids and book ids.
+    'L42' is loan #42; 'B7' or a bare '7' is a copy of book #7, so scanning the
+    same book twice returns two of its open loans.
+    """
+    loan_ids = set()
+    book_counts = Counter()
+    invalid = []
+    for code in codes:
+        code = code.strip()
+        if not code:
+            continue
+        match = SCAN_CODE_RE.match(code)
+        if not match:
+            invalid.append(code)
+        elif match.group(1).upper() == 'L':
+            loan_ids.add(int(match.group(2)))
+        else:
+            book_counts[int(match.group(2))] += 1
+    return loan_ids, book_counts, invalid
+
+def return_loans(codes, now=None, user_id=None):
+    """
+    Closes the open loans matching a batch of scan codes and puts the copies
+    back on the shelf. Loans are resolved with two SELECTs and closed with one
+    UPDATE on loans and one on books, all in a single transaction.
+    Returns (returned_count, unmatched_codes).
+    """
+    now = now or datetime.utcnow()
+    loan_ids, book_counts, unmatched = parse_scan_codes(codes)
+
+    found_loan_ids = set()
+    if loan_ids:
+        found_loan_ids = set(db.session.scalars(
+            select(Loan.id).where(Loan.id.in_(loan_ids), Loan.status.in_(OPEN_LOAN_STATUSES))
+        ).all())
+        unmatched += [f'L{loan_id}' for loan_id in sorted(loan_ids - found_loan_ids)]
+
+    if book_counts:
+        # Oldest due copy goes back first; loans already picked by an L-code are skipped
+        open_loans = db.session.execute(
+            select(Loan.id, Loan.book_id)
+            .where(Loan.book_id.in_(book_counts.keys()),
+                   Loan.status.in_(OPEN_LOAN_STATUSES),
+                   Loan.id.notin_(found_loan_ids))
+            .order_by(Loan.book_id, Loan.due_date, Loan.id)
+        ).all()
+        wanted = Counter(book_counts)
+        for loan in open_loans:
+            if wanted[loan.book_id] > 0:
+                found_loan_ids.add(loan.id)
+                wanted[loan.book_id] -= 1
+        unmatched += [f'B{book_id}' for book_id, left in sorted(wanted.items()) for _ in range(left)]
+
+    if not found_loan_ids:
+        return 0, unmatched
+
+    returned_book_ids = db.session.scalars(
+        update(Loan)
+        .where(Loan.id.in_(found_loan_ids), Loan.status.in_(OPEN_LOAN_STATUSES))
+        .values(status='returned', return_date=now)
+        .returning(Loan.book_id),
+        execution_options={'synchronize_session': False}
+    ).all()
+
+    per_book = Counter(returned_book_ids)
+    if per_book:
+        delta = case(per_book, value=Book.id, else_=0)
+        db.session.execute(
+            update(Book).where(Book.id.in_(per_book.keys()))
+            .values(stock_available=Book.stock_available + delta,
+                    stock_borrowed=Book.stock_borrowed - delta,
+                    version_id=Book.version_id + 1),
+            execution_options={'synchronize_session': False}
+        )
+        record_movements(
+            movement(book_id, 'return', available=count, borrowed=-count, user_id=user_id)
+            for book_id, count in per_book.items()
+        )
+    db.session.commit()
+    return len(returned_book_ids), unmatched
+
+@bp.cli.command('sweep-loans')
+@click.option('--batch-size', type=int, default=None, help='Loans per transaction.')
+def sweep_loans_command(batch_size):
+    """Mark overdue loans and queue due-date emails.
+
+    Safe to run from cron every few minutes; follow it with `flask main send-mail`.
+    """
+    overdue = sweep_overdue_loans(batch_size=batch_size)
+    reminders = queue_due_reminders(batch_size=batch_size)
+    click.echo(f'{overdue} loan(s) marked overdue, {reminders} reminder(s) queued.')
@@ -0,0 +1,130 @@
+import os
+import tempfile
+import threading
+import click
+from flask import current_app, url_for
+from PIL import Image, ImageOps
+from sqlalchemy import select
+from app.extensions import db
+from app.main import bp
+from app.models import Blob
+from app.main.blob_utils import blob_path, parse_blob_url
+from app.tasks import submit
+
+# Every cover is rendered at each COVER_WIDTHS width in both formats
+VARIANT_FORMATS = {'jpg': ('JPEG', {'quality': 80, 'optimize': True, 'progressive': True}),
+                   'webp': ('WEBP', {'quality': 75, 'method': 4})}
+
+_queued = set()
+_queued_lock = threading.Lock()
+
+def variant_path(sha256, width, fmt):
+    """Variants sit beside their blob, so gc-blobs removes them with it."""
+    return f'{blob_path(sha256)}.w{width}.{fmt}'
+
+def _flatten(image):
+    if image.mode == 'RGB':
+        return image
+    if image.mode in ('RGBA', 'LA', 'P', 'PA'):
+        # JPEG has no alpha; put transparent PNGs on white rather than black
+        rgba = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+def _save(image, path, fmt):
+    name, options = VARIANT_FORMATS[fmt]
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            image.save(out, name, **options)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    # The rename keeps requests off half-written files
+    os.replace(tmp, path)
+
+def make_variants(sha256):
+    """
+    Renders a stored image at every COVER_WIDTHS width (at most 3:2 tall) as
+    JPEG and WebP, beside its blob. The image is decoded once, straight to
+    roughly the largest size for JPEGs, and each width is scaled from the
+    one above. Returns the number of files written, or None if the image
+    can't be decoded.
+    """
+    widths = sorted(current_app.config['COVER_WIDTHS'], reverse=True)
+    missing = {(width, fmt) for width in widths for fmt in VARIANT_FORMATS
+               if not os.path.exists(variant_path(sha256, width, fmt))}
+    if not missing:
+        return 0
+    try:
+        with Image.open(blob_path(sha256)) as image:
+            image.draft('RGB', (widths[0], widths[0] * 3 // 2))
+            # Phone photos are stored sideways with an EXIF rotation
+            image = _flatten(ImageOps.exif_transpose(image))
+        for width in widths:
+            image.thumbnail((width, width * 3 // 2))
+            for fmt in VARIANT_FORMATS:
+                if (width, fmt) in missing:
+                    _save(image, variant_path(sha256, width, fmt), fmt)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        current_app.logger.warning(f"Could not render cover sizes of blob {sha256}: {e}")
+        return None
+    return len(missing)
+
+def _make_queued_variants(sha256):
+    try:
+        return make_variants(sha256)
+    finally:
+        with _queued_lock:
+            _queued.discard(sha256)
+
+def queue_variants(url):
+    """
+    Renders a cover's sizes on the background pool; call after the upload
+    commits. A cover already queued in this process is not queued again.
+    """
+    sha256 = parse_blob_url(url)
+    if not sha256:
+        return None
+    with _queued_lock:
+        if sha256 in _queued:
+            return None
+        _queued.add(sha256)
+    return submit(_make_queued_variants, sha256)
+
+def variant_url(sha256, width, fmt='jpg'):
+    return url_for('main.blob_variant', sha256=sha256, width=width, fmt=fmt)
+
+@bp.app_template_filter('thumbnail')
+def thumbnail_url(url, width=None):
+    """
+    A small version of a cover or photo URL, for an img src. Only blob URLs
+    have sizes; static and placeholder URLs come back unchanged.
+    """
+    sha256 = parse_blob_url(url)
+    if not sha256:
+        return url
+    return variant_url(sha256, width or current_app.config['COVER_THUMB_WIDTH'])
+
+@bp.app_template_filter('srcset')
+def srcset(url, fmt='jpg'):
+    """Every size of a blob cover as a srcset value, or '' for other URLs."""
+    sha256 = parse_blob_url(url)
+    if not sha256:
+        return ''
+    return ', '.join(f'{variant_url(sha256, width, fmt)} {width}w'
+                     for width in sorted(current_app.config['COVER_WIDTHS']))
+
+@bp.cli.command('make-cover-variants')
+def make_cover_variants_command():
+    """Render the sizes of every stored image that is missing some."""
+    rendered = failed = 0
+    for sha256 in db.session.scalars(select(Blob.sha256).where(Blob.content_type.like('image/%'))).all():
+        written = make_variants(sha256)
+        if written is None:
+            failed += 1
+        elif written:
+            rendered += 1
+    click.echo(f'{rendered} image(s) rendered, {failed} could not be read.')
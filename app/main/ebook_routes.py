@@ -1,8 +1,20 @@
-from flask import render_template, redirect, url_for, flash, request, current_app
+from flask import (render_template, redirect, url_for, flash, request, current_app, send_file, abort, jsonify,
+                   Response)
 from flask_login import login_required, current_user
 from app.main import bp
 from app.extensions import db
-from app.models import EBook
+from app.models import EBook, EBookPage, UploadSession
+from app.main.ebook_utils import (media_filename, media_path, media_type, media_url, save_media, remove_media,
+                                  save_cover, remove_cover, list_filters, fetch_ebook_page)
+from app.main.inventory_forms import CATEGORIES
+from app.main.pdf_utils import index_ebook_pages, page_path, purge_page_cache
+from app.main.ebook_search_utils import search_ebooks, purge_text_index
+from app.main.progress_utils import record_progress, get_progress, purge_progress
+from app.main.cover_utils import queue_variants
+from app.main.audio_utils import (index_ebook_audio, load_audio_index, parse_timestamp, locate, wav_header,
+                                  read_range)
+from app.main.upload_session_utils import (upload_errors, start_upload, received_chunks, write_chunk,
+                                           ready_upload, place_upload, discard_upload)
 import os
 from werkzeug.utils import secure_filename
 from datetime import datetime
@@ -21,10 +33,30 @@ def is_pdf_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() == 'pdf'
 
+def ready_uploads(upload_ids):
+    """Finished chunked uploads named by the form, keyed by kind; returns (uploads, error)."""
+    uploads = {}
+    for kind, upload_id in upload_ids.items():
+        if upload_id:
+            upload, error = ready_upload(upload_id, kind, current_user.id)
+            if error:
+                return None, error
+            uploads[kind] = upload
+    return uploads, None
+
 @bp.route('/ebooks')
 def ebook_list():
-    ebooks = EBook.query.order_by(EBook.uploaded_at.desc()).all()
-    return render_template('ebooks/list.html', ebooks=ebooks)
+    filters = list_filters(request.args)
+    ebooks, next_cursor = fetch_ebook_page(filters, request.args.get('cursor'))
+    return render_template('ebooks/list.html', ebooks=ebooks, next_cursor=next_cursor,
+                           filters=dict(filters), categories=CATEGORIES)
+
+@bp.route('/ebooks/search')
+@login_required
+def ebook_search():
+    query = request.args.get('q', '').strip()
+    results = search_ebooks(query) if query else []
+    return render_template('ebooks/search.html', query=query, results=results)
 
 @bp.route('/ebooks/upload', methods=['GET', 'POST'])
 @login_required
@@ -37,73 +69,80 @@ def ebook_upload():
         title = request.form.get('title')
         author = request.form.get('author')
         description = request.form.get('description')
+        category = request.form.get('category') if request.form.get('category') in CATEGORIES else None
         
-        # Check if the post request has the file part
-        if 'file' not in request.files:
-            flash('No file part', 'danger')
-            return redirect(request.url)
-        
-        file = request.files['file']
+        # Large files arrive beforehand in chunks; the form then names their upload sessions
+        file = request.files.get('file')
         cover_image = request.files.get('cover_image')
         audio_file = request.files.get('audio_file')
+        pdf_upload = request.form.get('pdf_upload')
+        audio_upload = request.form.get('audio_upload')
 
-        if file.filename == '':
+        if not pdf_upload and (file is None or file.filename == ''):
             flash('No selected file', 'danger')
             return redirect(request.url)
 
-        if file and is_pdf_file(file.filename):
-            filename = secure_filename(file.filename)
-            upload_folder = os.path.join(current_app.root_path, 'static', 'ebooks')
-            audio_folder = os.path.join(current_app.root_path, 'static', 'ebooks', 'audio')
-            
-            # Ensure directories exist
-            os.makedirs(upload_folder, exist_ok=True)
-            os.makedirs(audio_folder, exist_ok=True)
-            
-            file_path = os.path.join(upload_folder, filename)
-            file.save(file_path)
+        if pdf_upload or is_pdf_file(file.filename):
+            # Every chunked upload is checked before any file is moved into place
+            uploads, error = ready_uploads({'pdf': pdf_upload, 'audio': audio_upload})
+            if error:
+                flash(error, 'danger')
+                return redirect(request.url)
+
+            # Stored outside static/ and served by ebook_media after a login check
+            filename = place_upload(uploads['pdf']) if 'pdf' in uploads else save_media(file, 'pdf')
 
             # Handle Audio File
             audio_filename_str = None
-            if audio_file and audio_file.filename != '' and is_audio_file(audio_file.filename):
-                audio_filename = secure_filename(audio_file.filename)
-                audio_path = os.path.join(audio_folder, audio_filename)
-                audio_file.save(audio_path)
-                audio_filename_str = audio_filename # Store purely filename, path relative to static/ebooks/audio
+            if 'audio' in uploads:
+                audio_filename_str = place_upload(uploads['audio'])
+            elif audio_file and audio_file.filename != '' and is_audio_file(audio_file.filename):
+                audio_filename_str = save_media(audio_file, 'audio') # Store purely filename, under EBOOK_FOLDER/audio
             
             # Handle Cover Image
             cover_image_url = None
             if cover_image and cover_image.filename != '':
-                cover_filename = secure_filename(cover_image.filename)
-                cover_path = os.path.join(current_app.root_path, 'static', 'ebooks', 'covers')
-                os.makedirs(cover_path, exist_ok=True)
-                cover_image.save(os.path.join(cover_path, cover_filename))
-                cover_image_url = url_for('static', filename=f'ebooks/covers/{cover_filename}')
+                cover_image_url = save_cover(cover_image)
             
             new_ebook = EBook(
                 title=title,
                 author=author,
                 description=description,
-                file_path=filename, # Store filename relative to static/ebooks
+                category=category,
+                file_path=filename, # Store filename relative to EBOOK_FOLDER
                 audio_path=audio_filename_str,
-                cover_image_url=cover_image_url if cover_image_url else 'https://placehold.co/200x300?text=No+Cover'
+                cover_image_url=cover_image_url or EBook.__table__.c.cover_image_url.default.arg
             )
             
             db.session.add(new_ebook)
             db.session.commit()
+
+            # Page sizes, the audio seek index and cover sizes; the upload returns without waiting
+            index_ebook_pages(new_ebook.id)
+            if new_ebook.audio_path:
+                index_ebook_audio(new_ebook.id)
+            queue_variants(new_ebook.cover_image_url)
             
             flash('E-book uploaded successfully!', 'success')
             return redirect(url_for('main.ebook_list'))
         else:
             flash('Invalid file type. Only PDF allowed.', 'danger')
 
-    return render_template('ebooks/upload.html')
+    return render_template('ebooks/upload.html', categories=CATEGORIES)
 
 @bp.route('/ebooks/read/<int:id>')
 @login_required
 def ebook_read(id):
     ebook = EBook.query.get_or_404(id)
-    return render_template('ebooks/read.html', ebook=ebook)
+    # Page sizes let the reader lay out the whole book before fetching a page
+    # (only the sizes: the pages' extracted text is for search and can be large)
+    pages = [list(size) for size in ebook.pages.with_entities(EBookPage.width, EBookPage.height)] \
+        if ebook.page_count else []
+    progress = get_progress(current_user.id, ebook.id) or {}
+    # An explicit ?page= (e.g. from search) wins over where the reader left off
+    start_page = request.args.get('page', type=int) or progress.get('page')
+    return render_template('ebooks/read.html', ebook=ebook, pages=pages, pdf_url=media_url(ebook, 'pdf'),
+                           start_page=start_page)
 
 @bp.route('/ebooks/edit/<int:id>', methods=['GET', 'POST'])
 @login_required
@@ -118,65 +157,64 @@ def ebook_edit(id):
         ebook.title = request.form.get('title')
         ebook.author = request.form.get('author')
         ebook.description = request.form.get('description')
+        ebook.category = request.form.get('category') if request.form.get('category') in CATEGORIES else None
+        reindex = False
+        new_audio = False
+
+        uploads, error = ready_uploads({'pdf': request.form.get('pdf_upload'),
+                                        'audio': request.form.get('audio_upload')})
+        if error:
+            flash(error, 'danger')
+            return redirect(request.url)
 
         # Handle File Update
         file = request.files.get('file')
-        if file and file.filename != '' and is_pdf_file(file.filename):
-            filename = secure_filename(file.filename)
-            upload_folder = os.path.join(current_app.root_path, 'static', 'ebooks')
-            
+        if 'pdf' in uploads or (file and file.filename != '' and is_pdf_file(file.filename)):
             # Remove old file
-            if ebook.file_path:
-                old_file_path = os.path.join(upload_folder, ebook.file_path)
-                if os.path.exists(old_file_path):
-                    os.remove(old_file_path)
+            remove_media(ebook.file_path, 'pdf')
             
             # Save new file
-            file_path = os.path.join(upload_folder, filename)
-            file.save(file_path)
-            ebook.file_path = filename
+            ebook.file_path = place_upload(uploads['pdf']) if 'pdf' in uploads else save_media(file, 'pdf')
+            # Old pages no longer match; the reader uses the whole file until re-indexed
+            ebook.page_count = None
+            purge_page_cache(ebook.id)
+            reindex = True
 
         # Handle Audio Update
         audio_file = request.files.get('audio_file')
-        if audio_file:
+        if 'audio' in uploads:
+            remove_media(ebook.audio_path, 'audio')
+            ebook.audio_path = place_upload(uploads['audio'])
+            new_audio = True
+        elif audio_file:
             # Check if user uploaded a file
             if audio_file.filename != '' and is_audio_file(audio_file.filename):
-                audio_filename = secure_filename(audio_file.filename)
-                audio_folder = os.path.join(current_app.root_path, 'static', 'ebooks', 'audio')
-                os.makedirs(audio_folder, exist_ok=True)
-
                 # Remove old audio
-                if ebook.audio_path:
-                    old_audio_path = os.path.join(audio_folder, ebook.audio_path)
-                    if os.path.exists(old_audio_path):
-                        os.remove(old_audio_path)
+                remove_media(ebook.audio_path, 'audio')
                 
                 # Save new audio
-                new_audio_path = os.path.join(audio_folder, audio_filename)
-                audio_file.save(new_audio_path)
-                ebook.audio_path = audio_filename
+                ebook.audio_path = save_media(audio_file, 'audio')
+                new_audio = True
 
         # Handle Cover Update
         cover_image = request.files.get('cover_image')
-        if cover_image and cover_image.filename != '':
-            cover_filename = secure_filename(cover_image.filename)
-            cover_path = os.path.join(current_app.root_path, 'static', 'ebooks', 'covers')
-            
-            # Remove old cover if it's not the placeholder
-            if 'placehold.co' not in ebook.cover_image_url:
-                old_cover_name = ebook.cover_image_url.split('/')[-1]
-                old_cover_path = os.path.join(cover_path, old_cover_name)
-                if os.path.exists(old_cover_path):
-                    os.remove(old_cover_path)
-
-            cover_image.save(os.path.join(cover_path, cover_filename))
-            ebook.cover_image_url = url_for('static', filename=f'ebooks/covers/{cover_filename}')
+        new_cover = cover_image and cover_image.filename != ''
+        if new_cover:
+            # Release the old cover (another book may still share it)
+            remove_cover(ebook.cover_image_url)
+            ebook.cover_image_url = save_cover(cover_image)
 
         db.session.commit()
+        if reindex:
+            index_ebook_pages(ebook.id)
+        if new_audio:
+            index_ebook_audio(ebook.id)
+        if new_cover:
+            queue_variants(ebook.cover_image_url)
         flash('E-book updated successfully!', 'success')
         return redirect(url_for('main.ebook_list'))
 
-    return render_template('ebooks/edit.html', ebook=ebook)
+    return render_template('ebooks/edit.html', ebook=ebook, categories=CATEGORIES)
 
 @bp.route('/ebooks/listen/<int:id>')
 @login_required
@@ -185,7 +223,173 @@ def ebook_listen(id):
     if not ebook.audio_path:
         flash('Audio book not available for this title.', 'warning')
         return redirect(url_for('main.ebook_list'))
-    return render_template('ebooks/listen.html', ebook=ebook)
+    progress = get_progress(current_user.id, ebook.id) or {}
+    return render_template('ebooks/listen.html', ebook=ebook, audio_url=media_url(ebook, 'audio'),
+                           position=progress.get('position') or 0)
+
+@bp.route('/ebooks/<int:id>/<any(pdf, audio):kind>')
+@login_required
+def ebook_media(id, kind):
+    ebook = EBook.query.get_or_404(id)
+    path = media_path(ebook, kind)
+    if path is None:
+        abort(404)
+
+    # send_file answers Range requests with 206 and only the bytes asked for,
+    # handing the open file to the server's sendfile (or X-Sendfile when
+    # USE_X_SENDFILE is on), and validates If-None-Match/If-Modified-Since.
+    # Blob files have no extension on disk; the type comes from the stored name
+    response = send_file(path, mimetype=media_type(media_filename(ebook, kind)), conditional=True, etag=True,
+                         max_age=current_app.config['EBOOK_MEDIA_MAX_AGE'])
+    # Behind a login: browsers may cache it, shared proxies may not
+    response.cache_control.public = False
+    response.cache_control.private = True
+    # Advertise seeking on the first full response too, not only on 206s
+    response.headers['Accept-Ranges'] = 'bytes'
+    return response
+
+@bp.route('/ebooks/<int:id>/progress', methods=['GET', 'POST'])
+@login_required
+def ebook_progress(id):
+    if request.method == 'GET':
+        return jsonify(dict(get_progress(current_user.id, id) or {'page': None, 'position': None}, success=True))
+
+    # sendBeacon posts on page hide may arrive as text/plain, so don't insist on the header
+    data = request.get_json(force=True, silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'errors': ['Send a JSON object with a page or position.']}), 400
+    page, position = data.get('page'), data.get('position')
+    # bool is an int subclass; true/false are not pages or seconds
+    if page is not None and (isinstance(page, bool) or not isinstance(page, int) or page < 1):
+        return jsonify({'success': False, 'errors': ['Page must be a positive whole number.']}), 400
+    if position is not None and (isinstance(position, bool) or not isinstance(position, (int, float))
+                                 or position < 0):
+        return jsonify({'success': False, 'errors': ['Position must be seconds from the start.']}), 400
+    # Buffered in memory and written in the next batch; the reader gets an answer without a query
+    record_progress(current_user.id, id, page=page, position=position)
+    return '', 204
+
+@bp.route('/ebooks/<int:id>/audio/segment')
+@login_required
+def ebook_audio_segment(id):
+    ebook = EBook.query.get_or_404(id)
+    path = media_path(ebook, 'audio')
+    if path is None:
+        abort(404)
+    index = load_audio_index(path)
+    if index is None:
+        # Not indexed yet (or an older upload); build it and ask the client to come back
+        index_ebook_audio(ebook.id)
+        return jsonify({'success': False, 'errors': ['This audiobook is still being indexed.']}), 503, \
+            {'Retry-After': '10'}
+
+    start = parse_timestamp(request.args.get('start', '0'))
+    end = parse_timestamp(request.args['end']) if request.args.get('end') else index['duration']
+    if start is None or end is None or end < start:
+        return jsonify({'success': False, 'errors': ['Give start and end as seconds or h:mm:ss.']}), 400
+
+    start_time, byte_start = locate(path, index, start)
+    end_time, byte_end = locate(path, index, end) if end < index['duration'] else \
+        (index['duration'], index['data_end'])
+    headers = {'X-Segment-Start': f'{start_time:.3f}', 'X-Segment-End': f'{end_time:.3f}',
+               'X-Audio-Duration': f"{index['duration']:.3f}"}
+
+    if request.args.get('format') == 'json':
+        # For clients that fetch the bytes themselves with a Range request on the cacheable URL
+        return jsonify({
+            'success': True,
+            'start': start_time,
+            'end': end_time,
+            'duration': index['duration'],
+            'url': media_url(ebook, 'audio'),
+            'range': f'bytes={byte_start}-{byte_end - 1}',
+        })
+
+    # Raw MP3 frames play from any frame boundary; a WAV slice needs its own header
+    prefix = wav_header(index, byte_end - byte_start) if index['format'] == 'wav' else b''
+
+    def body():
+        if prefix:
+            yield prefix
+        yield from read_range(path, byte_start, byte_end)
+
+    mimetype = 'audio/wav' if prefix else media_type(media_filename(ebook, 'audio'))
+    response = Response(body(), mimetype=mimetype, headers=headers)
+    response.content_length = len(prefix) + byte_end - byte_start
+    response.cache_control.private = True
+    response.cache_control.max_age = current_app.config['EBOOK_MEDIA_MAX_AGE']
+    return response
+
+@bp.route('/ebooks/<int:id>/pages/<int:number>.pdf')
+@login_required
+def ebook_page(id, number):
+    ebook = EBook.query.get_or_404(id)
+    path = page_path(ebook, number)
+    if path is None:
+        abort(404)
+
+    # Cut pages never change (a new PDF purges them), so browsers can keep them
+    response = send_file(path, mimetype='application/pdf', conditional=True, etag=True,
+                         max_age=current_app.config['EBOOK_MEDIA_MAX_AGE'])
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
+
+def own_upload_or_404(upload_id):
+    upload = db.session.get(UploadSession, upload_id)
+    if upload is None or upload.user_id != current_user.id:
+        abort(404)
+    return upload
+
+def upload_status(upload):
+    return {
+        'id': upload.id,
+        'filename': upload.filename,
+        'size': upload.size,
+        'chunk_size': upload.chunk_size,
+        'chunk_count': upload.chunk_count,
+        'received': received_chunks(upload),
+    }
+
+@bp.route('/ebooks/uploads', methods=['POST'])
+@login_required
+def ebook_upload_start():
+    if not current_user.is_admin():
+        return jsonify({'success': False, 'errors': ['Admins only.']}), 403
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'errors': ['Send a JSON object describing the file.']}), 400
+    errors = upload_errors(data.get('kind'), data.get('filename'), data.get('size'), data.get('sha256'))
+    if errors:
+        return jsonify({'success': False, 'errors': errors}), 400
+
+    upload = start_upload(current_user.id, data['kind'], data['filename'], data['size'], data.get('sha256'))
+    db.session.commit()
+    return jsonify(dict(upload_status(upload), success=True)), 201
+
+@bp.route('/ebooks/uploads/<upload_id>', methods=['GET', 'DELETE'])
+@login_required
+def ebook_upload_status(upload_id):
+    upload = own_upload_or_404(upload_id)
+    if request.method == 'DELETE':
+        discard_upload(upload)
+        db.session.commit()
+        return jsonify({'success': True})
+    # What a resuming client still has to send
+    return jsonify(dict(upload_status(upload), success=True))
+
+@bp.route('/ebooks/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+@login_required
+def ebook_upload_chunk(upload_id, index):
+    upload = own_upload_or_404(upload_id)
+    # The raw body, read straight from the socket rather than parsed as a form
+    error = write_chunk(upload, index, request.stream, request.headers.get('X-Chunk-SHA256'))
+    if error:
+        db.session.rollback()
+        return jsonify({'success': False, 'errors': [error]}), 400
+    db.session.commit()
+    return jsonify({'success': True, 'index': index})
 
 @bp.route('/ebooks/delete/<int:id>', methods=['POST'])
 @login_required
@@ -196,27 +400,13 @@ def ebook_delete(id):
     
     ebook = EBook.query.get_or_404(id)
     
-    # Remove files
-    upload_folder = os.path.join(current_app.root_path, 'static', 'ebooks')
-    
-    # Remove PDF
-    if ebook.file_path:
-        file_path = os.path.join(upload_folder, ebook.file_path)
-        if os.path.exists(file_path):
-            os.remove(file_path)
-
-    # Remove Audio
-    if ebook.audio_path:
-        audio_path = os.path.join(upload_folder, 'audio', ebook.audio_path)
-        if os.path.exists(audio_path):
-            os.remove(audio_path)
-
-    # Remove Cover
-    if 'placehold.co' not in ebook.cover_image_url:
-        cover_name = ebook.cover_image_url.split('/')[-1]
-        cover_path = os.path.join(upload_folder, 'covers', cover_name)
-        if os.path.exists(cover_path):
-            os.remove(cover_path)
+    # Release PDF, audio and cover; files shared with other books stay
+    remove_media(ebook.file_path, 'pdf')
+    remove_media(ebook.audio_path, 'audio')
+    remove_cover(ebook.cover_image_url)
+    purge_page_cache(ebook.id)
+    purge_text_index(ebook.id)
+    purge_progress(ebook.id)
 
     db.session.delete(ebook)
     db.session.commit()
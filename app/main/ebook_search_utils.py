@@ -0,0 +1,141 @@
+import re
+from collections import Counter
+import click
+from flask import current_app
+from pypdf import PdfReader
+from sqlalchemy import select, insert, update, delete, func, case, or_, and_, tuple_
+from app.extensions import db
+from app.main import bp
+from app.models import EBook, EBookPage, EBookTerm
+from app.main.ebook_utils import media_path
+
+# Letters and digits, plus the whole Bengali block so vowel signs don't split words
+WORD = re.compile(r'[\w\u0980-\u09ff]+')
+STOPWORDS = frozenset('a an and are as at be by for from in is it of on or that the this to was with'.split())
+MAX_TERM = 64
+BATCH = 500
+SNIPPET_CHARS = 80
+
+def terms(text):
+    """Lower-cased index terms of a piece of text, in order, stopwords dropped."""
+    return [word for word in WORD.findall((text or '').lower().replace('_', ' '))
+            if len(word) > 1 and len(word) <= MAX_TERM and word not in STOPWORDS]
+
+def _batches(items):
+    for start in range(0, len(items), BATCH):
+        yield items[start:start + BATCH]
+
+def build_text_index(ebook_id, reader=None):
+    """
+    Extracts each page's text and brings the e-book's inverted index up to
+    date. Only pages whose text changed are rewritten, so replacing a PDF
+    with a corrected edition costs as much as the pages that differ.
+    Expects the page rows from pdf_utils.build_page_index. Returns the
+    number of pages reindexed, or None if the PDF can't be read.
+    """
+    ebook = db.session.get(EBook, ebook_id)
+    path = media_path(ebook, 'pdf') if ebook else None
+    if path is None:
+        return None
+    try:
+        reader = reader or PdfReader(path)
+        pages = reader.pages
+    except Exception as e:
+        current_app.logger.warning(f"Could not read e-book #{ebook_id} for search: {e}")
+        return None
+
+    stored = dict(db.session.execute(
+        select(EBookPage.number, EBookPage.text).where(EBookPage.ebook_id == ebook_id)
+    ).all())
+    changed = {}
+    for number in range(1, len(pages) + 1):
+        if number not in stored:
+            continue
+        try:
+            text = ' '.join((pages[number - 1].extract_text() or '').split())
+        except Exception:
+            # One damaged page shouldn't keep the rest of the book out of search
+            text = ''
+        if stored[number] != text:
+            changed[number] = text
+
+    for numbers in _batches(list(changed)):
+        db.session.execute(delete(EBookTerm).where(EBookTerm.ebook_id == ebook_id, EBookTerm.page.in_(numbers)))
+    # Pages that a shorter replacement PDF no longer has
+    db.session.execute(delete(EBookTerm).where(EBookTerm.ebook_id == ebook_id, EBookTerm.page > len(pages)))
+    if changed:
+        db.session.execute(update(EBookPage), [
+            {'ebook_id': ebook_id, 'number': number, 'text': text} for number, text in changed.items()
+        ])
+        rows = [
+            {'term': term, 'ebook_id': ebook_id, 'page': number, 'count': count}
+            for number, text in changed.items() for term, count in Counter(terms(text)).items()
+        ]
+        for batch in _batches(rows):
+            db.session.execute(insert(EBookTerm), batch)
+    db.session.commit()
+    return len(changed)
+
+def purge_text_index(ebook_id):
+    """Drops an e-book's search terms in one statement. Does not commit."""
+    db.session.execute(delete(EBookTerm).where(EBookTerm.ebook_id == ebook_id))
+
+def _snippet(text, words):
+    """(before, match, after) around the first query word on a page, or None."""
+    lowered = (text or '').lower()
+    found = [(lowered.find(word), word) for word in words if lowered.find(word) >= 0]
+    if not found:
+        return None
+    position, word = min(found)
+    start = max(0, position - SNIPPET_CHARS)
+    end = position + len(word) + SNIPPET_CHARS
+    return (('…' if start else '') + text[start:position], text[position:position + len(word)],
+            text[position + len(word):end] + ('…' if end < len(text) else ''))
+
+def search_ebooks(query, limit=50):
+    """
+    Pages containing every word of the query, the last word as a prefix so
+    results follow the user as they type. Each word is one range scan on
+    the term key. Returns [(ebook, [(page, hits, snippet), ...])], books
+    ordered by their best page.
+    """
+    words = list(dict.fromkeys(terms(query)))
+    if not words:
+        return []
+    conditions = [EBookTerm.term == word for word in words[:-1]]
+    # Every term starting with the last word: term >= word and term < word + U+FFFF
+    conditions.append(and_(EBookTerm.term >= words[-1], EBookTerm.term < words[-1] + '\uffff'))
+
+    hits = db.session.execute(
+        select(EBookTerm.ebook_id, EBookTerm.page, func.sum(EBookTerm.count).label('hits'))
+        .where(or_(*conditions))
+        .group_by(EBookTerm.ebook_id, EBookTerm.page)
+        # Each word checked on its own: one term can satisfy several ("nation nat")
+        .having(*[func.sum(case((condition, 1), else_=0)) > 0 for condition in conditions])
+        .order_by(func.sum(EBookTerm.count).desc(), EBookTerm.ebook_id, EBookTerm.page)
+        .limit(limit)
+    ).all()
+    if not hits:
+        return []
+
+    texts = dict(((row.ebook_id, row.number), row.text) for row in db.session.execute(
+        select(EBookPage.ebook_id, EBookPage.number, EBookPage.text)
+        .where(tuple_(EBookPage.ebook_id, EBookPage.number).in_([(hit.ebook_id, hit.page) for hit in hits]))
+    ))
+    ebooks = {ebook.id: ebook for ebook in EBook.query.filter(EBook.id.in_({hit.ebook_id for hit in hits}))}
+    results = {}
+    for hit in hits:
+        results.setdefault(hit.ebook_id, []).append(
+            (hit.page, hit.hits, _snippet(texts.get((hit.ebook_id, hit.page)), words)))
+    return [(ebooks[ebook_id], pages) for ebook_id, pages in results.items()]
+
+@bp.cli.command('index-ebook-text')
+def index_ebook_text_command():
+    """Extract and index the text of e-books whose pages have no text yet."""
+    pending = db.session.execute(
+        select(EBookPage.ebook_id).where(EBookPage.text.is_(None)).distinct()
+    ).scalars().all()
+    pages = 0
+    for ebook_id in pending:
+        pages += build_text_index(ebook_id) or 0
+    click.echo(f'{pages} page(s) indexed across {len(pending)} e-book(s).')
@@ -0,0 +1,194 @@
+import os
+import json
+import base64
+import shutil
+from datetime import datetime
+import click
+from flask import current_app, url_for
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.orm import load_only
+from app.extensions import db
+from app.main import bp
+from app.models import EBook, User, Book
+from app.main.blob_utils import (blob_path, blob_name, blob_url, parse_blob_name, parse_blob_url, extension_of,
+                                 store_blob, store_blob_file, release_blob)
+
+MEDIA_TYPES = {'pdf': 'application/pdf', 'mp3': 'audio/mpeg', 'wav': 'audio/wav'}
+LIST_PAGE_SIZE = 24
+# What a library card shows; description and file names stay in the database
+LIST_COLUMNS = (EBook.id, EBook.title, EBook.author, EBook.category, EBook.cover_image_url, EBook.audio_path,
+                EBook.uploaded_at)
+
+def media_folder(kind, legacy=False):
+    """Where PDFs ('pdf') or audio ('audio') are stored; legacy is the old static/ebooks tree."""
+    root = (os.path.join(current_app.root_path, 'static', 'ebooks') if legacy
+            else current_app.config['EBOOK_FOLDER'])
+    return os.path.join(root, 'audio') if kind == 'audio' else root
+
+def media_filename(ebook, kind):
+    return ebook.audio_path if kind == 'audio' else ebook.file_path
+
+def media_path(ebook, kind):
+    """Absolute path of an e-book's PDF or audio file, or None if it is missing."""
+    filename = media_filename(ebook, kind)
+    if not filename:
+        return None
+    sha256 = parse_blob_name(filename)
+    if sha256:
+        path = blob_path(sha256)
+        return path if os.path.isfile(path) else None
+    for legacy in (False, True):
+        path = os.path.join(media_folder(kind, legacy), filename)
+        if os.path.isfile(path):
+            return path
+    return None
+
+def list_filters(args):
+    """The e-library filters in request args, as a tuple of (name, value) pairs."""
+    filters = []
+    for name in ('category', 'author'):
+        value = (args.get(name) or '').strip()
+        if value:
+            filters.append((name, value))
+    return tuple(filters)
+
+def encode_list_cursor(ebook):
+    return base64.urlsafe_b64encode(json.dumps([ebook.uploaded_at.isoformat(), ebook.id]).encode()).decode()
+
+def decode_list_cursor(cursor):
+    try:
+        uploaded_at, ebook_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(uploaded_at), int(ebook_id)
+    except (ValueError, TypeError):
+        return None
+
+def fetch_ebook_page(filters, cursor=None, limit=LIST_PAGE_SIZE):
+    """
+    One page of the e-library, newest first. Keyset-paged on (uploaded_at, id)
+    like the inventory grid, so a deep page reads no more rows than the
+    first, and only the columns a card shows are loaded.
+    Returns (ebooks, next_cursor); next_cursor is None on the last page.
+    """
+    stmt = select(EBook).options(load_only(*LIST_COLUMNS))
+    for name, value in filters:
+        if name == 'category':
+            stmt = stmt.where(EBook.category == value)
+        elif name == 'author':
+            # Prefix match so "arif" finds "Arif Azad". A range on lower(author)
+            # rather than LIKE: it reads ix_ebooks_author_lower on SQLite and
+            # PostgreSQL alike, and % or _ in the value are plain characters
+            author, prefix = func.lower(EBook.author), func.lower(value)
+            stmt = stmt.where(author >= prefix, author < prefix + '\uffff')
+    position = decode_list_cursor(cursor) if cursor else None
+    if position:
+        stmt = stmt.where(tuple_(EBook.uploaded_at, EBook.id) < position)
+    stmt = stmt.order_by(EBook.uploaded_at.desc(), EBook.id.desc())
+
+    ebooks = db.session.scalars(stmt.limit(limit + 1)).all()
+    next_cursor = None
+    if len(ebooks) > limit:
+        ebooks = ebooks[:limit]
+        next_cursor = encode_list_cursor(ebooks[-1])
+    return ebooks, next_cursor
+
+def media_type(filename):
+    return MEDIA_TYPES.get(filename.rsplit('.', 1)[-1].lower(), 'application/octet-stream')
+
+def media_url(ebook, kind):
+    """
+    Where the browser should fetch an e-book's PDF or audio: the blob's hash
+    URL, cacheable for good, or the per-book route for files stored by name.
+    """
+    filename = media_filename(ebook, kind)
+    sha256 = parse_blob_name(filename)
+    if sha256:
+        return blob_url(sha256, extension_of(filename))
+    return url_for('main.ebook_media', id=ebook.id, kind=kind)
+
+def save_media(file, kind):
+    """Stores an uploaded PDF or audio file in the blob store and returns its stored name."""
+    return blob_name(store_blob(file), extension_of(file.filename))
+
+def _shared(column, value):
+    # Legacy files were saved by name, so two books may have ended up on one file
+    return EBook.query.filter(column == value).count() > 1
+
+def remove_media(filename, kind):
+    """
+    Drops an e-book's claim on a stored file. Blobs shared with other books
+    stay; a file stored by name is deleted unless another book uses it too.
+    Call before the e-book row is deleted or repointed.
+    """
+    if not filename:
+        return
+    if parse_blob_name(filename):
+        release_blob(parse_blob_name(filename))
+        return
+    if _shared(EBook.audio_path if kind == 'audio' else EBook.file_path, filename):
+        return
+    for legacy in (False, True):
+        path = os.path.join(media_folder(kind, legacy), filename)
+        for derived in (path, path + '.seek.json'):
+            if os.path.exists(derived):
+                os.remove(derived)
+
+def save_cover(file):
+    """Stores an uploaded cover image in the blob store and returns its URL."""
+    return blob_url(store_blob(file), extension_of(file.filename))
+
+def remove_cover(url):
+    """Drops an e-book's claim on its cover; legacy covers under static/ are deleted."""
+    sha256 = parse_blob_url(url)
+    if sha256:
+        release_blob(sha256)
+    elif url and url.startswith('/static/ebooks/covers/') and not _shared(EBook.cover_image_url, url):
+        path = os.path.join(current_app.root_path, 'static', 'ebooks', 'covers', url.split('/')[-1])
+        if os.path.exists(path):
+            os.remove(path)
+
+@bp.cli.command('move-ebook-files-to-blobs')
+def move_ebook_files_to_blobs_command():
+    """Move e-book files, book and e-book covers and profile photos stored by name into the blob store."""
+    static = os.path.join(current_app.root_path, 'static')
+    stored = 0
+    for ebook in EBook.query.all():
+        for kind in ('pdf', 'audio'):
+            filename = media_filename(ebook, kind)
+            path = media_path(ebook, kind)
+            if path and not parse_blob_name(filename):
+                # Copied, not moved: before this, books with the same filename shared one file
+                name = blob_name(store_blob_file(path, filename), extension_of(filename))
+                setattr(ebook, 'audio_path' if kind == 'audio' else 'file_path', name)
+                stored += 1
+
+    owners = [(ebook, 'cover_image_url') for ebook in EBook.query.all()]
+    owners += [(book, 'image_url') for book in Book.query.all()]
+    owners += [(user, column) for user in User.query.all() for column in ('profile_photo', 'cover_photo')]
+    # blob_url builds a URL, which needs a request outside of one
+    with current_app.test_request_context():
+        for owner, column in owners:
+            url = getattr(owner, column) or ''
+            path = os.path.join(static, url[len('/static/'):]) if url.startswith('/static/') else None
+            if path and os.path.isfile(path):
+                setattr(owner, column, blob_url(store_blob_file(path), extension_of(path)))
+                stored += 1
+    db.session.commit()
+    click.echo(f'{stored} file(s) stored in {current_app.config["BLOB_FOLDER"]}; '
+               'run `flask main make-cover-variants` for their sizes, '
+               'and remove the originals once the site is checked.')
+
+@bp.cli.command('move-ebook-files')
+def move_ebook_files_command():
+    """Move e-book PDFs and audio out of static/ebooks into EBOOK_FOLDER."""
+    moved = 0
+    for ebook in EBook.query.all():
+        for kind in ('pdf', 'audio'):
+            filename = media_filename(ebook, kind)
+            if not filename:
+                continue
+            source = os.path.join(media_folder(kind, legacy=True), filename)
+            if os.path.isfile(source):
+                os.makedirs(media_folder(kind), exist_ok=True)
+                shutil.move(source, os.path.join(media_folder(kind), filename))
+                moved += 1
+    click.echo(f'{moved} file(s) moved to {current_app.config["EBOOK_FOLDER"]}.')
@@ -0,0 +1,91 @@
+import csv
+import io
+from datetime import datetime, timedelta
+from flask import Response, request, stream_with_context, abort
+from flask_login import login_required
+from sqlalchemy import select
+from app import db
+from app.main import bp
+from app.models import Book, Sale, Loan, User
+from app.decorators import staff_required
+
+EXPORT_BATCH_SIZE = 1000
+FLUSH_BYTES = 64 * 1024
+
+def parse_date_range(date_column):
+    """Turns ?start=YYYY-MM-DD&end=YYYY-MM-DD into filters; `end` is inclusive."""
+    filters = []
+    try:
+        start = request.args.get('start')
+        end = request.args.get('end')
+        if start:
+            filters.append(date_column >= datetime.strptime(start, '%Y-%m-%d'))
+        if end:
+            filters.append(date_column < datetime.strptime(end, '%Y-%m-%d') + timedelta(days=1))
+    except ValueError:
+        abort(400, 'Dates must be in YYYY-MM-DD format.')
+    return filters
+
+def iter_csv(header, stmt):
+    """
+    Yields `stmt` as CSV text. Rows come off a server-side cursor in batches
+    of EXPORT_BATCH_SIZE and leave in ~64KB pieces, so memory stays flat.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    result = db.session.execute(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    for row in result:
+        writer.writerow(row)
+        if buffer.tell() >= FLUSH_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def csv_response(filename, header, stmt):
+    """Streams `stmt` as a CSV download that starts before the query has finished."""
+    return Response(
+        stream_with_context(iter_csv(header, stmt)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+@bp.route('/export/books.csv')
+@login_required
+@staff_required
+def export_books():
+    stmt = select(
+        Book.id, Book.title, Book.author, Book.item_type, Book.category, Book.location,
+        Book.price, Book.stock_total, Book.stock_available, Book.stock_borrowed, Book.stock_sold
+    ).order_by(Book.id)
+    category = request.args.get('category')
+    if category:
+        stmt = stmt.where(Book.category == category)
+    header = ['id', 'title', 'author', 'item_type', 'category', 'location',
+              'price', 'stock_total', 'stock_available', 'stock_borrowed', 'stock_sold']
+    return csv_response('inventory.csv', header, stmt)
+
+@bp.route('/export/sales.csv')
+@login_required
+@staff_required
+def export_sales():
+    stmt = select(
+        Sale.id, Sale.sale_date, Sale.book_id, Book.title, Sale.user_id, User.username, Sale.price_at_sale
+    ).join(Book, Book.id == Sale.book_id).join(User, User.id == Sale.user_id)\
+        .where(*parse_date_range(Sale.sale_date)).order_by(Sale.sale_date, Sale.id)
+    header = ['id', 'sale_date', 'book_id', 'title', 'user_id', 'username', 'price_at_sale']
+    return csv_response('sales.csv', header, stmt)
+
+@bp.route('/export/loans.csv')
+@login_required
+@staff_required
+def export_loans():
+    stmt = select(
+        Loan.id, Loan.checkout_date, Loan.due_date, Loan.return_date, Loan.status,
+        Loan.book_id, Book.title, Loan.user_id, User.username
+    ).join(Book, Book.id == Loan.book_id).join(User, User.id == Loan.user_id)\
+        .where(*parse_date_range(Loan.checkout_date)).order_by(Loan.checkout_date, Loan.id)
+    header = ['id', 'checkout_date', 'due_date', 'return_date', 'status',
+              'book_id', 'title', 'user_id', 'username']
+    return csv_response('loans.csv', header, stmt)
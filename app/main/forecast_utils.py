@@ -0,0 +1,137 @@
+import math
+from datetime import date, datetime, time, timedelta
+import click
+import numpy as np
+from flask import current_app
+from sqlalchemy import select, insert, update, func
+from app.extensions import db
+from app.main import bp
+from app.models import Sale, Loan, DemandForecast
+from app.main.stock_utils import LEDGER_CHUNK_SIZE, iter_book_id_chunks
+
+def _as_date(value):
+    # date() comes back as text on SQLite and as a date on PostgreSQL
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+def daily_demand(book_ids, start, end):
+    """
+    Copies sold plus copies borrowed per book per day, for start <= day < end,
+    as a (len(book_ids), days) array. One GROUP BY per source table; every
+    Sale and Loan row is a single copy.
+    """
+    index = {book_id: i for i, book_id in enumerate(book_ids)}
+    demand = np.zeros((len(book_ids), (end - start).days))
+    window = (datetime.combine(start, time.min), datetime.combine(end, time.min))
+
+    for book_col, when in ((Sale.book_id, Sale.sale_date), (Loan.book_id, Loan.checkout_date)):
+        day = func.date(when)
+        rows = db.session.execute(
+            select(book_col, day, func.count())
+            .where(book_col.in_(book_ids), when >= window[0], when < window[1])
+            .group_by(book_col, day)
+        ).all()
+        if rows:
+            books = np.fromiter((index[row[0]] for row in rows), dtype=int, count=len(rows))
+            days = np.fromiter(((_as_date(row[1]) - start).days for row in rows), dtype=int, count=len(rows))
+            np.add.at(demand, (books, days), np.fromiter((row[2] for row in rows), dtype=float, count=len(rows)))
+    return demand
+
+def reorder_policy(rate, variance, config):
+    """
+    Turns daily demand estimates into (reorder_point, suggested_qty) arrays.
+
+    The reorder point covers expected demand over the supplier lead time plus
+    FORECAST_SERVICE_Z standard deviations of safety stock. The suggested
+    quantity tops a book that has just dropped below it back up to cover the
+    lead time and one review period.
+    """
+    lead = config['FORECAST_LEAD_TIME_DAYS']
+    cover = lead + config['FORECAST_REVIEW_DAYS']
+    z = config['FORECAST_SERVICE_Z']
+    sigma = np.sqrt(variance)
+
+    reorder_point = np.ceil(rate * lead + z * sigma * math.sqrt(lead))
+    reorder_point = np.maximum(reorder_point, config['FORECAST_MIN_REORDER_POINT'])
+    order_up_to = np.ceil(rate * cover + z * sigma * math.sqrt(cover))
+    suggested_qty = np.maximum(order_up_to - reorder_point + 1, 1)
+    return reorder_point.astype(int), suggested_qty.astype(int)
+
+def update_forecasts(today=None, chunk_size=LEDGER_CHUNK_SIZE):
+    """
+    Folds every whole day since the last run into each book's exponentially
+    weighted demand rate and variance, then refreshes its reorder point and
+    suggested quantity. Books seen for the first time replay
+    FORECAST_HISTORY_DAYS of history. Runs one chunk of books per
+    transaction; returns the number of forecasts written.
+    """
+    config = current_app.config
+    today = today or datetime.utcnow().date()
+    through = today - timedelta(days=1)
+    first_day = today - timedelta(days=config['FORECAST_HISTORY_DAYS'])
+    alpha = config['FORECAST_SMOOTHING']
+
+    written = 0
+    for ids in iter_book_id_chunks(chunk_size):
+        existing = {
+            row.book_id: row for row in db.session.execute(
+                select(DemandForecast.book_id, DemandForecast.rate, DemandForecast.variance,
+                       DemandForecast.computed_through)
+                .where(DemandForecast.book_id.in_(ids))
+            )
+        }
+        next_day = [existing[i].computed_through + timedelta(days=1) if i in existing else first_day
+                    for i in ids]
+        start = min(next_day)
+        if start > through:
+            continue
+
+        rate = np.array([existing[i].rate if i in existing else 0.0 for i in ids])
+        variance = np.array([existing[i].variance if i in existing else 0.0 for i in ids])
+        # Days already folded in for a book are skipped for that book only
+        skip = np.array([(day - start).days for day in next_day])
+
+        demand = daily_demand(ids, start, today)
+        for day in range(demand.shape[1]):
+            active = skip <= day
+            diff = demand[:, day] - rate
+            step = alpha * diff
+            rate = np.where(active, rate + step, rate)
+            variance = np.where(active, (1 - alpha) * (variance + diff * step), variance)
+
+        reorder_point, suggested_qty = reorder_policy(rate, variance, config)
+        now = datetime.utcnow()
+        rows = [
+            {
+                'book_id': book_id,
+                'rate': float(rate[i]),
+                'variance': float(variance[i]),
+                'reorder_point': int(reorder_point[i]),
+                'suggested_qty': int(suggested_qty[i]),
+                'computed_through': through,
+                'computed_at': now,
+            }
+            for i, book_id in enumerate(ids)
+        ]
+        updates = [row for row in rows if row['book_id'] in existing]
+        inserts = [row for row in rows if row['book_id'] not in existing]
+        if updates:
+            db.session.execute(update(DemandForecast), updates)
+        if inserts:
+            db.session.execute(insert(DemandForecast), inserts)
+        db.session.commit()
+        written += len(rows)
+    return written
+
+def delete_forecast(book_id):
+    """Removes a book's forecast ahead of deleting the book itself."""
+    db.session.query(DemandForecast).filter_by(book_id=book_id).delete(synchronize_session=False)
+
+@bp.cli.command('forecast-demand')
+@click.option('--chunk-size', type=int, default=LEDGER_CHUNK_SIZE, help='Books per transaction.')
+def forecast_demand_command(chunk_size):
+    """Refresh per-book demand forecasts and reorder points.
+
+    Run once a day from cron, after midnight UTC; a run on the same day is a no-op.
+    """
+    written = update_forecasts(chunk_size=chunk_size)
+    click.echo(f'{written} forecast(s) updated.')
@@ -0,0 +1,233 @@
+import csv
+import io
+import json
+import math
+import os
+from collections import Counter
+import click
+from sqlalchemy import insert, select
+from app.extensions import db
+from app.main import bp
+from app.models import Book
+from app.main.stock_utils import movement, record_movements
+from app.main.blob_utils import parse_blob_url, retain_blob
+
+ITEM_TYPES = {'circulation', 'sale', 'hybrid'}
+IMPORT_CHUNK_SIZE = 2000
+READ_BLOCK_SIZE = 64 * 1024
+MAX_RECORD_SIZE = 1024 * 1024 # A JSON record still open past this is taken as a broken file
+MAX_REPORTED_ERRORS = 50
+DEFAULT_COVER = Book.__table__.c.image_url.default.arg
+
+def iter_csv_rows(stream):
+    """Yields one dict per CSV line from a binary stream, never reading the whole file."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(text)
+    try:
+        yield from reader
+    except csv.Error as e:
+        # NUL bytes, an unclosed quote, an oversized field: the route reports ValueErrors
+        raise ValueError(f'Malformed CSV near line {reader.line_num}: {e}')
+
+def iter_json_rows(stream):
+    """
+    Yields objects from either a top-level JSON array or JSON Lines.
+    The array is decoded element by element from a rolling buffer, so memory
+    stays bounded by the size of one record rather than the file; a record
+    that is still open after MAX_RECORD_SIZE characters is an error.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig')
+    decoder = json.JSONDecoder()
+    buffer = text.read(READ_BLOCK_SIZE).lstrip()
+    if not buffer:
+        return
+
+    in_array = buffer.startswith('[')
+    if in_array:
+        buffer = buffer[1:]
+    eof = False
+
+    while True:
+        buffer = buffer.lstrip()
+        if in_array and buffer.startswith(','):
+            buffer = buffer[1:].lstrip()
+        if in_array and buffer.startswith(']'):
+            return
+        if not buffer and eof:
+            return
+        try:
+            obj, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise ValueError('Malformed JSON near: ' + buffer[:80])
+            if len(buffer) > MAX_RECORD_SIZE:
+                raise ValueError(f'A JSON record is over {MAX_RECORD_SIZE // 1024} KB or never closes, near: '
+                                 + buffer[:80])
+            block = text.read(READ_BLOCK_SIZE)
+            eof = not block
+            buffer += block
+            continue
+        yield obj
+        buffer = buffer[end:]
+        if len(buffer) < READ_BLOCK_SIZE and not eof:
+            block = text.read(READ_BLOCK_SIZE)
+            eof = not block
+            buffer += block
+
+def iter_rows(stream, filename):
+    """Picks a parser from the file extension."""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.csv':
+        return iter_csv_rows(stream)
+    if extension in ('.json', '.jsonl', '.ndjson'):
+        return iter_json_rows(stream)
+    raise ValueError('Unsupported file type. Use CSV or JSON.')
+
+def validate_row(raw):
+    """
+    Normalises one imported record into Book column values.
+    Returns (values, None) or (None, error message).
+    """
+    if not isinstance(raw, dict):
+        return None, 'Record is not an object'
+
+    def text(key, default=None):
+        value = raw.get(key)
+        if value is None:
+            return default
+        value = str(value).strip()
+        return value or default
+
+    title = text('title')
+    author = text('author')
+    if not title or not author:
+        return None, 'Title and author are required'
+    if len(title) > 140 or len(author) > 140:
+        return None, 'Title or author longer than 140 characters'
+
+    try:
+        price = float(text('price', ''))
+    except ValueError:
+        return None, 'Price must be a number'
+    if not math.isfinite(price):
+        return None, 'Price must be a finite number'
+    if price < 0:
+        return None, 'Price cannot be negative'
+
+    try:
+        stock_total = int(text('stock_total', '1'))
+    except (ValueError, OverflowError):
+        return None, 'Stock must be a whole number'
+    if stock_total < 0:
+        return None, 'Stock cannot be negative'
+
+    item_type = text('item_type', 'hybrid').lower()
+    if item_type not in ITEM_TYPES:
+        return None, f'Unknown item type "{item_type}"'
+
+    category = text('category', 'General')
+    location = text('location')
+    image_url = text('image_url')
+    if len(category) > 50 or (location and len(location) > 100) or (image_url and len(image_url) > 500):
+        return None, 'Category, location or image URL too long'
+
+    values = {
+        'title': title,
+        'author': author,
+        'price': price,
+        'item_type': item_type,
+        'category': category,
+        'location': location,
+        'stock_total': stock_total,
+        'stock_available': stock_total, # Initially all available
+        'stock_borrowed': 0,
+        'stock_sold': 0,
+        'image_url': image_url or DEFAULT_COVER,
+    }
+    return values, None
+
+def _insert_chunk(chunk):
+    """
+    Drops rows whose (title, author) already exists, then bulk inserts the rest.
+    The existence check is one indexed query per chunk, not one per row.
+    """
+    titles = {row['title'] for row in chunk}
+    existing = {
+        tuple(row) for row in db.session.execute(
+            select(Book.title, Book.author).where(Book.title.in_(titles))
+        )
+    }
+
+    fresh = []
+    for row in chunk:
+        key = (row['title'], row['author'])
+        if key in existing:
+            continue
+        existing.add(key) # Also dedupes repeats inside the same chunk
+        fresh.append(row)
+
+    if fresh:
+        created = db.session.execute(
+            insert(Book).returning(Book.id, Book.stock_total), fresh
+        ).all()
+        record_movements(
+            movement(book_id, 'import', total=stock_total, available=stock_total)
+            for book_id, stock_total in created
+        )
+        # Rows pointing at stored covers count as references to them
+        for sha256, count in Counter(parse_blob_url(row['image_url']) for row in fresh).items():
+            retain_blob(sha256, count)
+    db.session.commit()
+    return len(fresh), len(chunk) - len(fresh)
+
+def import_books(rows, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+    """
+    Validates and inserts books from any iterable of dicts, committing every
+    `chunk_size` valid rows. `progress(summary)` is called after each chunk.
+    """
+    summary = {'processed': 0, 'inserted': 0, 'duplicates': 0, 'invalid': 0, 'errors': []}
+    chunk = []
+
+    def flush():
+        inserted, duplicates = _insert_chunk(chunk)
+        summary['inserted'] += inserted
+        summary['duplicates'] += duplicates
+        chunk.clear()
+        if progress:
+            progress(summary)
+
+    for line_no, raw in enumerate(rows, start=1):
+        summary['processed'] += 1
+        values, error = validate_row(raw)
+        if error:
+            summary['invalid'] += 1
+            if len(summary['errors']) < MAX_REPORTED_ERRORS:
+                summary['errors'].append(f'Row {line_no}: {error}')
+            continue
+        chunk.append(values)
+        if len(chunk) >= chunk_size:
+            flush()
+
+    if chunk:
+        flush()
+    return summary
+
+@bp.cli.command('import-books')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE, help='Rows per transaction.')
+def import_books_command(path, chunk_size):
+    """Bulk import books from a CSV or JSON file."""
+    def report(summary):
+        click.echo(f"{summary['processed']} read, {summary['inserted']} added, "
+                   f"{summary['duplicates']} duplicates, {summary['invalid']} invalid")
+
+    with open(path, 'rb') as stream:
+        try:
+            summary = import_books(iter_rows(stream, path), chunk_size, progress=report)
+        except ValueError as e:
+            db.session.rollback()
+            raise click.ClickException(str(e))
+
+    for error in summary['errors']:
+        click.echo(error, err=True)
+    click.echo(f"Done. {summary['inserted']} book(s) imported.")
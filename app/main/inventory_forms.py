@@ -1,12 +1,24 @@
 from flask_wtf import FlaskForm
-from wtforms import IntegerField, SubmitField, StringField, SelectField,FloatField
-from wtforms.validators import DataRequired, InputRequired, NumberRange, Length, URL
+from wtforms import IntegerField, SubmitField, StringField, SelectField,FloatField, HiddenField
+from wtforms.validators import DataRequired, InputRequired, NumberRange, Length, Optional, ValidationError
+
+CATEGORIES = ["General", "Bengali", "Islamic", "Fiction", "Non-Fiction", "Academic", "Children"]
+
+def is_image_url(value):
+    """An absolute http(s) URL, or a path on this site such as a /blobs/ cover or /placeholders/ image."""
+    value = (value or '').strip()
+    return value.startswith(('http://', 'https://')) or (value.startswith('/') and not value.startswith('//'))
+
+def site_or_http_url(form, field):
+    if field.data and not is_image_url(field.data):
+        raise ValidationError('Enter an http(s) URL or a path on this site starting with /.')
 
 class RestockForm(FlaskForm):
     quantity = IntegerField(
         "Quantity to Add",
         validators=[DataRequired(), NumberRange(min=1, message="Must be at least 1")]
     )
+    version_id = HiddenField() # Book.version_id the form was rendered from
     submit = SubmitField("Restock")
 
 class EditForm(FlaskForm):
@@ -27,22 +39,14 @@ class EditForm(FlaskForm):
         ("sale", "Sale"),
         ("hybrid", "Hybrid (Sell/Borrow)")
     ])
-    category = SelectField("Availability (Sell/Borrow)",choices=[    
-                ("General","General"),
-                ("Bengali","Bengali"),
-                ("Islamic","Islamic"),
-                ("Fiction","Fiction"),
-                ("Non-Fiction","Non-Fiction"),
-                ("Academic","Academic"),
-                ("Children","Children"),
-    ])
+    category = SelectField("Availability (Sell/Borrow)",choices=[(category, category) for category in CATEGORIES])
     location = StringField(
         "Location",
         validators=[DataRequired(), Length(min=1, max=100)]
     )
     image_url = StringField(
         "Image URL",
-        validators=[DataRequired(), URL(), Length(min=1, max=500)]
+        validators=[Optional(), site_or_http_url, Length(max=500)]
     )
     stock_available = FloatField(
         "Stock Available",
@@ -56,4 +60,5 @@ class EditForm(FlaskForm):
         "Stock Sold",
         validators=[InputRequired()]
     )
+    version_id = HiddenField() # Book.version_id the form was rendered from
     submit = SubmitField("Confirm")
@@ -1,15 +1,33 @@
-from flask import render_template, redirect, url_for, flash, request
-from flask_login import login_required
+from datetime import datetime, timedelta
+from flask import render_template, redirect, url_for, flash, request, jsonify
+from flask_login import login_required, current_user
+from sqlalchemy.orm.exc import StaleDataError
 from app import db
 from app.main import bp
-from app.models import Book
+from app.models import Book, StockMovement
 from app.decorators import staff_required
 
-from app.main.inventory_forms import RestockForm, EditForm
+from app.main.inventory_forms import RestockForm, EditForm, CATEGORIES, is_image_url
+from app.main.import_utils import import_books, iter_rows
+from app.main.stock_utils import (
+    COUNTERS, movement, record_movements, edit_movement, close_ledger, ledger_balances, stock_as_of
+)
+from app.main.inventory_utils import (
+    GRID_PAGE_SIZE, SORT_COLUMNS, BULK_FIELDS, grid_filters, fetch_inventory_page, cached_count,
+    parse_bulk_changes, apply_bulk_changes
+)
+from app.main.supplier_utils import crossed_threshold, reorder_points, populate_shortlist
+from app.main.forecast_utils import delete_forecast
+from app.main.blob_utils import parse_blob_url, retain_blob, release_blob, repoint_blob_url
 
-class PaginateProxy:
-    def __init__(self,items):
-        self.items = items
+def grid_args():
+    return {
+        'filters': grid_filters(request.args),
+        'sort': request.args.get('sort', 'title'),
+        'direction': request.args.get('dir', 'asc'),
+        'cursor': request.args.get('cursor'),
+        'limit': request.args.get('limit', GRID_PAGE_SIZE, type=int),
+    }
 
 @bp.route('/inventory')
 @login_required
@@ -17,11 +35,43 @@ class PaginateProxy:
 def inventory():
     target = request.args.get('target',None,type=int)
     if target:
-        books = PaginateProxy([Book.query.get(target)])
-        return render_template('inventory.html', books=books, single=True)
-    page = request.args.get('page', 1, type=int)
-    books = Book.query.paginate(page=page, per_page=10, error_out=False)
-    return render_template('inventory.html', books=books, single=False)
+        books = [Book.query.get_or_404(target)]
+        return render_template('inventory.html', books=books, single=True, categories=CATEGORIES)
+    args = grid_args()
+    books, next_cursor = fetch_inventory_page(**args)
+    return render_template('inventory.html', books=books, single=False,
+                           next_cursor=next_cursor, total=cached_count(args['filters']),
+                           sort=args['sort'], direction=args['direction'],
+                           sort_columns=SORT_COLUMNS.keys(), categories=CATEGORIES)
+
+@bp.route('/api/inventory')
+@login_required
+@staff_required
+def inventory_grid():
+    args = grid_args()
+    books, next_cursor = fetch_inventory_page(**args)
+    return jsonify({
+        'items': [
+            {
+                'id': book.id,
+                'title': book.title,
+                'author': book.author,
+                'item_type': book.item_type,
+                'category': book.category,
+                'location': book.location,
+                'price': book.price,
+                'image_url': book.image_url,
+                'stock_total': book.stock_total,
+                'stock_available': book.stock_available,
+                'stock_borrowed': book.stock_borrowed,
+                'stock_sold': book.stock_sold,
+            }
+            for book in books
+        ],
+        'html': render_template('inventory_rows.html', books=books),
+        'next_cursor': next_cursor,
+        'total': cached_count(args['filters']),
+    })
 
 @bp.route('/inventory/add', methods=['GET', 'POST'])
 @login_required
@@ -36,6 +86,9 @@ def add_book():
         stock_total = int(request.form.get('stock_total'))
         image_url = request.form.get('image_url')
         category = request.form.get('category')
+        if image_url and not is_image_url(image_url):
+            flash('Image URL must be an http(s) URL or a path on this site starting with /.', 'danger')
+            return redirect(request.url)
         
         book = Book(
             title=title,
@@ -49,11 +102,39 @@ def add_book():
             image_url=image_url if image_url else None
         )
         db.session.add(book)
+        db.session.flush()
+        # A /blobs/ cover pasted from another book is one more reference to it
+        retain_blob(parse_blob_url(book.image_url))
+        record_movements([movement(book.id, 'add', total=stock_total, available=stock_total,
+                                   user_id=current_user.id)])
         db.session.commit()
         flash('Book added to inventory!')
         return redirect(url_for('main.inventory'))
     return render_template('add_book.html')
 
+@bp.route('/inventory/import', methods=['GET', 'POST'])
+@login_required
+@staff_required
+def import_books_upload():
+    if request.method == 'POST':
+        file = request.files.get('file')
+        if not file or file.filename == '':
+            flash('No selected file', 'danger')
+            return redirect(request.url)
+
+        try:
+            summary = import_books(iter_rows(file.stream, file.filename))
+        except ValueError as e:
+            db.session.rollback()
+            flash(str(e), 'danger')
+            return redirect(request.url)
+
+        flash(f"Imported {summary['inserted']} of {summary['processed']} rows "
+              f"({summary['duplicates']} duplicates skipped, {summary['invalid']} invalid).",
+              'success' if summary['inserted'] else 'warning')
+        return render_template('import_books.html', summary=summary)
+    return render_template('import_books.html', summary=None)
+
 
 
 @bp.route("/inventory/restock/<int:book_id>", methods=["GET", "POST"])
@@ -62,20 +143,37 @@ def add_book():
 def restock_book(book_id):
     book = Book.query.get_or_404(book_id)
     form = RestockForm()
+    if request.method == "GET":
+        form.version_id.data = book.version_id
 
     if form.validate_on_submit():
         qty = form.quantity.data
+        if form.version_id.data != str(book.version_id):
+            return restock_conflict(form, book)
 
         # Update stock
         book.stock_total += qty
         book.stock_available += qty
+        record_movements([movement(book.id, 'restock', total=qty, available=qty,
+                                   user_id=current_user.id)])
 
-        db.session.commit()
+        try:
+            db.session.commit()
+        except StaleDataError:
+            db.session.rollback()
+            return restock_conflict(form, book)
         flash(f"Successfully restocked {qty} copies of '{book.title}'.", "success")
         return redirect(url_for("main.inventory"))
 
     return render_template("restock.html", form=form, book=book)
 
+def restock_conflict(form, book):
+    # Stamp the fresh version so confirming again applies on top of the current stock
+    form.version_id.data = book.version_id
+    flash(f"Stock for '{book.title}' changed while you were on this page. "
+          "Check the current numbers and confirm again.", "warning")
+    return render_template("restock.html", form=form, book=book), 409
+
 
 @bp.route("/inventory/edit/<int:book_id>", methods=["GET", "POST"])
 @login_required
@@ -94,27 +192,120 @@ def edit_book(book_id):
         form.stock_available.data = book.stock_available
         form.stock_borrowed.data = book.stock_borrowed
         form.stock_sold.data = book.stock_sold
+        form.version_id.data = book.version_id
 
     
     if form.validate_on_submit():
+        if form.version_id.data != str(book.version_id):
+            return edit_conflict(form, book)
+        before = {counter: getattr(book, counter) for counter in COUNTERS}
         book.title = form.title.data
         book.author = form.author.data
         book.price = form.price.data
         book.item_type = form.item_type.data
         book.category = form.category.data
         book.location = form.location.data
-        book.image_url = form.image_url.data
+        # Covers in the blob store are counted; a rollback below undoes this too
+        repoint_blob_url(book.image_url, form.image_url.data or None)
+        book.image_url = form.image_url.data or None
         book.stock_available = form.stock_available.data
         book.stock_borrowed = form.stock_borrowed.data
         book.stock_sold = form.stock_sold.data
         book.stock_total = book.stock_borrowed + book.stock_sold + book.stock_available
+        record_movements([edit_movement(book, before, user_id=current_user.id)])
                 
-        db.session.commit()
+        try:
+            if crossed_threshold(before['stock_available'], book.stock_available,
+                                 reorder_points([book.id])[book.id]):
+                populate_shortlist([book.id])
+            db.session.commit()
+        except StaleDataError:
+            db.session.rollback()
+            return edit_conflict(form, book)
         flash(f"Successfully Edited '{book.title}'.", "success")
         return redirect(url_for("main.inventory"))
 
     return render_template("edit_book.html", form=form, book=book)
 
+EDIT_FIELDS = ('title', 'author', 'price', 'item_type', 'category', 'location', 'image_url',
+               'stock_available', 'stock_borrowed', 'stock_sold')
+
+def edit_conflict(form, book):
+    """
+    Someone saved this book after the form was opened. Keep the staff member's
+    input, show it next to what is stored now, and stamp the current version
+    so submitting again is a deliberate overwrite.
+    """
+    conflicts = [
+        (getattr(form, field).label.text, getattr(form, field).data, getattr(book, field))
+        for field in EDIT_FIELDS
+        if getattr(form, field).data != getattr(book, field)
+    ]
+    form.version_id.data = book.version_id
+    flash(f"'{book.title}' was changed by someone else while you were editing. "
+          "Review the differences below and confirm again.", "warning")
+    return render_template("edit_book.html", form=form, book=book, conflicts=conflicts), 409
+
+
+@bp.route('/inventory/bulk', methods=['POST'])
+@login_required
+@staff_required
+def bulk_update():
+    if request.is_json:
+        data = request.get_json()
+        if not isinstance(data, dict) or not isinstance(data.get('changes') or [], list):
+            return jsonify({'success': False, 'errors': ['Send a JSON object with a list of changes.']}), 400
+        rows = data.get('changes') or []
+    else:
+        # Inventory grid: the same quantity/field values for every ticked book
+        shared = {field: request.form.get(field) for field in ('quantity',) + BULK_FIELDS}
+        rows = [dict(shared, id=book_id) for book_id in request.form.getlist('book_ids')]
+
+    changes, errors = parse_bulk_changes(rows)
+    missing = [] if errors else apply_bulk_changes(changes, user_id=current_user.id)
+    if missing:
+        errors.append(f'Unknown book id(s): {", ".join(map(str, missing))}')
+
+    if request.is_json:
+        if errors:
+            return jsonify({'success': False, 'errors': errors}), 400
+        return jsonify({'success': True, 'updated': len(changes)})
+
+    if not rows:
+        flash('Select at least one book.', 'warning')
+    elif errors:
+        for error in errors:
+            flash(error, 'danger')
+    else:
+        flash(f'{len(changes)} book(s) updated.', 'success')
+    return redirect(request.referrer or url_for('main.inventory'))
+
+@bp.route('/inventory/history/<int:book_id>')
+@login_required
+@staff_required
+def stock_history(book_id):
+    book = Book.query.get_or_404(book_id)
+
+    query = StockMovement.query.filter_by(book_id=book.id)
+    before = request.args.get('before', type=int)
+    if before:
+        query = query.filter(StockMovement.id < before)
+    movements = query.order_by(StockMovement.created_at.desc(), StockMovement.id.desc()).limit(50).all()
+
+    as_of = None
+    as_of_stock = None
+    if request.args.get('as_of'):
+        try:
+            as_of = datetime.strptime(request.args['as_of'], '%Y-%m-%d')
+        except ValueError:
+            flash('Dates must be in YYYY-MM-DD format.', 'danger')
+        else:
+            as_of_stock = stock_as_of(book.id, as_of + timedelta(days=1))
+
+    ledger = ledger_balances([book.id]).get(book.id)
+    return render_template('stock_history.html', book=book, movements=movements,
+                           as_of=as_of, as_of_stock=as_of_stock, ledger=ledger,
+                           counters=COUNTERS)
 
 @bp.route('/inventory/delete/<int:book_id>', methods=['POST'])
 @login_required
@@ -128,6 +319,10 @@ def delete_book(book_id):
         return redirect(url_for('main.inventory'))
 
     try:
+        # The stock ledger is append-only: the book's movements are kept, closed by a 'delete' movement
+        close_ledger(book, user_id=current_user.id)
+        delete_forecast(book.id)
+        release_blob(parse_blob_url(book.image_url))
         db.session.delete(book)
         db.session.commit()
         flash('Book removed successfully.', 'success')
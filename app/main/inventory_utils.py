@@ -0,0 +1,228 @@
+import base64
+import json
+import math
+import time
+import click
+from sqlalchemy import select, update, func, tuple_, case
+from app.extensions import db
+from app.main import bp
+from app.models import Book
+from app.main.import_utils import iter_rows
+from app.main.inventory_forms import CATEGORIES
+from app.main.stock_utils import movement, record_movements
+
+GRID_PAGE_SIZE = 25
+GRID_MAX_PAGE_SIZE = 200
+COUNT_CACHE_TTL = 60 # seconds
+COUNT_CACHE_SIZE = 256
+
+# Only NOT NULL-in-practice columns, so (value, id) keysets stay well ordered
+SORT_COLUMNS = {
+    'id': Book.id,
+    'title': Book.title,
+    'author': Book.author,
+    'price': Book.price,
+    'stock_total': Book.stock_total,
+    'stock_available': Book.stock_available,
+    'stock_sold': Book.stock_sold,
+}
+
+_count_cache = {}
+
+def encode_cursor(value, book_id):
+    return base64.urlsafe_b64encode(json.dumps([value, book_id]).encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        value, book_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return value, int(book_id)
+    except (ValueError, TypeError):
+        return None
+
+def grid_filters(args):
+    """
+    Reads the grid filters from request args into a hashable tuple of
+    (name, value) pairs, used both to build the query and as the count cache key.
+    """
+    filters = []
+    for name in ('category', 'item_type', 'location'):
+        value = (args.get(name) or '').strip()
+        if value:
+            filters.append((name, value))
+    for name in ('min_stock', 'max_stock'):
+        value = args.get(name, type=int)
+        if value is not None:
+            filters.append((name, value))
+    return tuple(filters)
+
+def _where(filters):
+    clauses = []
+    for name, value in filters:
+        if name == 'category':
+            clauses.append(Book.category == value)
+        elif name == 'item_type':
+            clauses.append(Book.item_type == value)
+        elif name == 'location':
+            # Prefix match so "Aisle 3" finds every shelf in the aisle and can use the index
+            clauses.append(Book.location.like(f'{value}%'))
+        elif name == 'min_stock':
+            clauses.append(Book.stock_available >= value)
+        elif name == 'max_stock':
+            clauses.append(Book.stock_available <= value)
+    return clauses
+
+def cached_count(filters):
+    """
+    COUNT(*) for a filter set, reused for COUNT_CACHE_TTL seconds.
+    Paging never triggers a count; at most one per filter set per minute.
+    """
+    now = time.monotonic()
+    hit = _count_cache.get(filters)
+    if hit and now - hit[1] < COUNT_CACHE_TTL:
+        return hit[0]
+    total = db.session.scalar(select(func.count(Book.id)).where(*_where(filters)))
+    if len(_count_cache) >= COUNT_CACHE_SIZE:
+        _count_cache.clear()
+    _count_cache[filters] = (total, now)
+    return total
+
+def fetch_inventory_page(filters, sort='title', direction='asc', cursor=None, limit=GRID_PAGE_SIZE):
+    """
+    Keyset pagination over books: the next page starts strictly after the
+    (sort value, id) of the last row, so page 500 costs the same as page 1.
+    Returns (books, next_cursor); next_cursor is None on the last page.
+    """
+    column = SORT_COLUMNS.get(sort, Book.title)
+    descending = direction == 'desc'
+    limit = max(1, min(limit or GRID_PAGE_SIZE, GRID_MAX_PAGE_SIZE))
+
+    stmt = select(Book).where(*_where(filters))
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        key = tuple_(column, Book.id)
+        stmt = stmt.where(key < position if descending else key > position)
+    if descending:
+        stmt = stmt.order_by(column.desc(), Book.id.desc())
+    else:
+        stmt = stmt.order_by(column, Book.id)
+
+    books = db.session.scalars(stmt.limit(limit + 1)).all()
+    next_cursor = None
+    if len(books) > limit:
+        books = books[:limit]
+        last = books[-1]
+        next_cursor = encode_cursor(getattr(last, column.key), last.id)
+    return books, next_cursor
+
+BULK_FIELDS = ('price', 'category', 'location')
+
+def parse_bulk_changes(rows):
+    """
+    Validates bulk restock/edit rows of the form
+    {'id': 3, 'quantity': 10, 'price': 250, 'category': 'Fiction', 'location': 'Aisle 2'},
+    where every key but id is optional. Returns (changes, errors); changes is
+    {book_id: {field: value}} with repeated ids merged and quantities summed.
+    """
+    changes = {}
+    errors = []
+    for line_no, raw in enumerate(rows, start=1):
+        if not isinstance(raw, dict):
+            errors.append(f'Row {line_no}: Record is not an object')
+            continue
+        raw = {key: value for key, value in raw.items() if value not in (None, '')}
+        try:
+            book_id = int(raw.get('id'))
+        except (TypeError, ValueError):
+            errors.append(f'Row {line_no}: Book id is required')
+            continue
+
+        change = {}
+        try:
+            if 'quantity' in raw:
+                change['quantity'] = int(raw['quantity'])
+            if 'price' in raw:
+                change['price'] = float(raw['price'])
+        except (TypeError, ValueError, OverflowError):
+            errors.append(f'Row {line_no}: Quantity and price must be numbers')
+            continue
+        if 'category' in raw:
+            change['category'] = str(raw['category']).strip()
+        if 'location' in raw:
+            change['location'] = str(raw['location']).strip()
+
+        error = None
+        if change.get('quantity', 1) < 1:
+            error = 'Quantity must be at least 1'
+        elif not math.isfinite(change.get('price', 0)):
+            # nan passes every comparison below and would be written as the price
+            error = 'Price must be a finite number'
+        elif change.get('price', 0) < 0:
+            error = 'Price cannot be negative'
+        elif change.get('category', CATEGORIES[0]) not in CATEGORIES:
+            error = f'Unknown category "{change["category"]}"'
+        elif len(change.get('location', '')) > 100:
+            error = 'Location longer than 100 characters'
+        if error:
+            errors.append(f'Row {line_no}: {error}')
+            continue
+        if not change:
+            errors.append(f'Row {line_no}: Nothing to change for book {book_id}')
+            continue
+
+        merged = changes.setdefault(book_id, {})
+        if 'quantity' in change:
+            change['quantity'] += merged.get('quantity', 0)
+        merged.update(change)
+    return changes, errors
+
+def apply_bulk_changes(changes, user_id=None):
+    """
+    Applies parsed bulk changes to every book with one UPDATE: each column is
+    a CASE over the book ids, falling back to its current value. Restocked
+    quantities are logged to the stock ledger in the same transaction.
+    Returns the ids that were not found (nothing is written if any are missing).
+    """
+    if not changes:
+        return []
+    found = set(db.session.scalars(select(Book.id).where(Book.id.in_(changes.keys()))).all())
+    missing = sorted(set(changes) - found)
+    if missing:
+        return missing
+
+    quantities = {book_id: c['quantity'] for book_id, c in changes.items() if 'quantity' in c}
+    values = {'version_id': Book.version_id + 1}
+    if quantities:
+        added = case(quantities, value=Book.id, else_=0)
+        values['stock_total'] = Book.stock_total + added
+        values['stock_available'] = Book.stock_available + added
+    for field in BULK_FIELDS:
+        mapping = {book_id: c[field] for book_id, c in changes.items() if field in c}
+        if mapping:
+            values[field] = case(mapping, value=Book.id, else_=getattr(Book, field))
+
+    db.session.execute(
+        update(Book).where(Book.id.in_(changes.keys())).values(**values),
+        execution_options={'synchronize_session': False}
+    )
+    record_movements(
+        movement(book_id, 'restock', total=quantity, available=quantity, user_id=user_id)
+        for book_id, quantity in quantities.items()
+    )
+    db.session.commit()
+    return []
+
+@bp.cli.command('bulk-update')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+def bulk_update_command(path):
+    """Restock or edit many books from a CSV/JSON file (id, quantity, price, category, location)."""
+    with open(path, 'rb') as stream:
+        changes, errors = parse_bulk_changes(iter_rows(stream, path))
+    for error in errors:
+        click.echo(error, err=True)
+    if errors:
+        raise click.ClickException('No changes applied; fix the rows above first.')
+
+    missing = apply_bulk_changes(changes)
+    if missing:
+        raise click.ClickException(f'Unknown book id(s): {", ".join(map(str, missing))}')
+    click.echo(f'{len(changes)} book(s) updated.')
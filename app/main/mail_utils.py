@@ -0,0 +1,89 @@
+from datetime import datetime
+import click
+from flask import current_app
+from flask_mail import Message
+from sqlalchemy import insert, update
+from app.extensions import db, mail
+from app.main import bp
+from app.models import MailOutbox
+
+def enqueue_emails(messages):
+    """
+    Queues many emails with a single multi-row INSERT.
+    `messages` is an iterable of dicts with recipient, subject and body, and
+    optionally attachment_name, attachment_type and attachment (text).
+    Nothing is sent here; the caller's transaction decides whether they go out.
+    """
+    rows = [
+        {'recipient': m['recipient'], 'subject': m['subject'], 'body': m['body'],
+         'attachment_name': m.get('attachment_name'), 'attachment_type': m.get('attachment_type'),
+         'attachment': m.get('attachment'), 'created_at': datetime.utcnow(), 'attempts': 0}
+        for m in messages if m.get('recipient')
+    ]
+    if rows:
+        db.session.execute(insert(MailOutbox), rows)
+    return len(rows)
+
+def flush_outbox(batch_size=None):
+    """
+    Delivers queued emails over a single SMTP connection per batch.
+    Stops at the first failed batch so a dead mail server is not hammered;
+    rows that keep failing are skipped after MAIL_OUTBOX_MAX_ATTEMPTS.
+    """
+    batch_size = batch_size or current_app.config['MAIL_OUTBOX_BATCH_SIZE']
+    max_attempts = current_app.config['MAIL_OUTBOX_MAX_ATTEMPTS']
+    sender = ("ChupChap Support", current_app.config['ADMINS'][0])
+    sent = 0
+    last_id = 0
+
+    while True:
+        batch = MailOutbox.query.filter(
+            MailOutbox.sent_at.is_(None),
+            MailOutbox.attempts < max_attempts,
+            MailOutbox.id > last_id
+        ).order_by(MailOutbox.id).limit(batch_size).all()
+        if not batch:
+            break
+        last_id = batch[-1].id
+        delivered = []
+        error = None
+
+        try:
+            with mail.connect() as conn:
+                for row in batch:
+                    msg = Message(row.subject, sender=sender, recipients=[row.recipient], body=row.body)
+                    if row.attachment_name:
+                        msg.attach(row.attachment_name, row.attachment_type or 'text/plain', row.attachment)
+                    conn.send(msg)
+                    delivered.append(row.id)
+        except Exception as e:
+            error = e
+
+        failed = [row.id for row in batch[len(delivered):]]
+        if delivered:
+            db.session.execute(
+                update(MailOutbox).where(MailOutbox.id.in_(delivered))
+                .values(sent_at=datetime.utcnow(), attempts=MailOutbox.attempts + 1),
+                execution_options={'synchronize_session': False}
+            )
+        if failed:
+            db.session.execute(
+                update(MailOutbox).where(MailOutbox.id.in_(failed))
+                .values(attempts=MailOutbox.attempts + 1),
+                execution_options={'synchronize_session': False}
+            )
+        db.session.commit()
+        sent += len(delivered)
+
+        if error is not None:
+            current_app.logger.warning(f"Outbox delivery failed: {error}")
+            break
+
+    return sent
+
+@bp.cli.command('send-mail')
+@click.option('--batch-size', type=int, default=None, help='Emails per SMTP connection.')
+def send_mail_command(batch_size):
+    """Deliver queued emails from the outbox."""
+    sent = flush_outbox(batch_size)
+    click.echo(f'{sent} email(s) sent.')
@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+import click
+from flask import current_app
+from pypdf import PdfReader, PdfWriter
+from sqlalchemy import select, insert, update, delete
+from app.extensions import db
+from app.main import bp
+from app.models import EBook, EBookPage
+from app.main.ebook_utils import media_path
+from app.main.ebook_search_utils import build_text_index
+from app.tasks import submit
+
+def page_cache_folder(ebook_id):
+    return os.path.join(current_app.config['EBOOK_FOLDER'], 'pages', str(ebook_id))
+
+def purge_page_cache(ebook_id):
+    shutil.rmtree(page_cache_folder(ebook_id), ignore_errors=True)
+
+def build_page_index(ebook_id):
+    """
+    Reads an e-book's PDF once and records its page count and page sizes, so
+    the reader can lay out every page before fetching any of them, then
+    brings the search index up to date from the same parse. Page rows are
+    updated in place so unchanged text need not be reindexed; cached pages
+    are dropped. Returns the page count, or None if the PDF is missing or
+    unreadable.
+    """
+    ebook = db.session.get(EBook, ebook_id)
+    path = media_path(ebook, 'pdf') if ebook else None
+    if path is None:
+        return None
+    try:
+        reader = PdfReader(path)
+        sizes = []
+        for page in reader.pages:
+            width, height = float(page.mediabox.width), float(page.mediabox.height)
+            sizes.append((height, width) if page.rotation % 180 else (width, height))
+    except Exception as e:
+        current_app.logger.warning(f"Could not index pages of e-book #{ebook_id}: {e}")
+        return None
+
+    existing = set(db.session.execute(
+        select(EBookPage.number).where(EBookPage.ebook_id == ebook_id)
+    ).scalars())
+    rows = [{'ebook_id': ebook_id, 'number': number, 'width': width, 'height': height}
+            for number, (width, height) in enumerate(sizes, start=1)]
+    db.session.execute(delete(EBookPage).where(EBookPage.ebook_id == ebook_id, EBookPage.number > len(sizes)))
+    if any(row['number'] in existing for row in rows):
+        db.session.execute(update(EBookPage), [row for row in rows if row['number'] in existing])
+    if any(row['number'] not in existing for row in rows):
+        db.session.execute(insert(EBookPage), [row for row in rows if row['number'] not in existing])
+    ebook.page_count = len(sizes)
+    purge_page_cache(ebook_id)
+    db.session.commit()
+
+    # The reader can open the book now; text extraction is the slow part
+    build_text_index(ebook_id, reader)
+    return len(sizes)
+
+def index_ebook_pages(ebook_id):
+    """Builds the page index on the background pool; call after the upload commits."""
+    return submit(build_page_index, ebook_id)
+
+def _cut_pages(source, folder, numbers):
+    # One parse of the source PDF for the whole run of pages
+    reader = PdfReader(source)
+    os.makedirs(folder, exist_ok=True)
+    for number in numbers:
+        writer = PdfWriter()
+        writer.add_page(reader.pages[number - 1])
+        fd, tmp = tempfile.mkstemp(dir=folder, suffix='.part')
+        with os.fdopen(fd, 'wb') as out:
+            writer.write(out)
+        # Readers never see a half-written page, even with several workers
+        os.replace(tmp, os.path.join(folder, f'{number}.pdf'))
+
+def page_path(ebook, number):
+    """
+    Path of a single-page PDF for page `number`, cut from the book on first
+    request along with the next EBOOK_PAGE_PREFETCH uncached pages, which
+    the reader is about to ask for. None if the page does not exist.
+    """
+    if not ebook.page_count or not 1 <= number <= ebook.page_count:
+        return None
+    folder = page_cache_folder(ebook.id)
+    path = os.path.join(folder, f'{number}.pdf')
+    if os.path.isfile(path):
+        return path
+
+    source = media_path(ebook, 'pdf')
+    if source is None:
+        return None
+    last = min(ebook.page_count, number + current_app.config['EBOOK_PAGE_PREFETCH'])
+    missing = [n for n in range(number, last + 1) if not os.path.isfile(os.path.join(folder, f'{n}.pdf'))]
+    _cut_pages(source, folder, missing)
+    return path
+
+@bp.cli.command('index-ebook-pages')
+@click.option('--all', 'reindex', is_flag=True, help='Rebuild books that already have an index.')
+def index_ebook_pages_command(reindex):
+    """Build the page index for e-books uploaded before it existed."""
+    query = EBook.query if reindex else EBook.query.filter(EBook.page_count.is_(None))
+    indexed = 0
+    for ebook_id in [ebook.id for ebook in query]:
+        if build_page_index(ebook_id) is not None:
+            indexed += 1
+    click.echo(f'{indexed} e-book(s) indexed.')
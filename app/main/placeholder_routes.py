@@ -0,0 +1,17 @@
+import hashlib
+from flask import current_app, request, Response
+from app.main import bp
+from app.main.placeholder_utils import render_placeholder, MAX_TEXT
+
+@bp.route('/placeholders/<any(cover, avatar, banner):kind>.svg')
+def placeholder(kind):
+    # Trimmed before the render cache sees it, so long query strings can't fill memory
+    svg = render_placeholder(kind, request.args.get('text', '')[:MAX_TEXT])
+    response = Response(svg, mimetype='image/svg+xml')
+    # The same URL always draws the same image, so browsers and kiosk proxies can keep it
+    response.set_etag(hashlib.md5(svg.encode()).hexdigest())
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config['PLACEHOLDER_MAX_AGE']
+    # Opened on its own, the SVG still can't run anything
+    response.headers['Content-Security-Policy'] = "default-src 'none'"
+    return response.make_conditional(request)
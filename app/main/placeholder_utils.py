@@ -0,0 +1,70 @@
+import hashlib
+from functools import lru_cache
+from xml.sax.saxutils import escape
+from flask import url_for
+from app.main import bp
+
+PLACEHOLDER_PREFIX = '/placeholders/'
+# Width, height and how many characters fit on a line of the title
+SIZES = {'cover': (200, 300, 14), 'avatar': (200, 200, None), 'banner': (1200, 400, 40)}
+# Background colours, picked by the text so each title keeps its colour
+PALETTE = ('#4F46E5', '#1E3A8A', '#0F766E', '#B45309', '#9D174D', '#374151', '#6D28D9', '#047857')
+DEFAULT_TEXT = {'cover': 'No Cover', 'avatar': '', 'banner': ''}
+MAX_TEXT = 120
+MAX_LINES = 5
+
+@bp.app_template_test('placeholder')
+def is_placeholder(url):
+    """True for no image, one of our placeholders, or a placehold.co URL saved before they existed."""
+    return not url or url.startswith(PLACEHOLDER_PREFIX) or 'placehold.co/' in url
+
+def _lines(text, width):
+    lines = []
+    for word in text.split():
+        if lines and len(lines[-1]) + 1 + len(word) <= width:
+            lines[-1] += ' ' + word
+        else:
+            lines.append(word[:width])
+    if len(lines) > MAX_LINES:
+        lines = lines[:MAX_LINES]
+        lines[-1] = lines[-1][:width - 1] + '…'
+    return lines
+
+def initials(text):
+    return ''.join(word[0] for word in text.split()[:2]).upper()
+
+@lru_cache(maxsize=1024)
+def render_placeholder(kind, text=''):
+    """
+    An SVG for a missing cover (the title, wrapped), avatar (initials) or
+    profile banner. Drawn with the system font, so there is nothing else
+    to fetch, and the same text always gives the same bytes.
+    """
+    width, height, columns = SIZES[kind]
+    text = ' '.join((text or DEFAULT_TEXT[kind]).split())[:MAX_TEXT]
+    background = PALETTE[int(hashlib.md5(text.encode()).hexdigest(), 16) % len(PALETTE)]
+    lines, size = [], 0
+    if text and kind == 'avatar':
+        lines, size = [initials(text)], 80
+    elif text:
+        lines, size = _lines(text, columns), 22 if kind == 'cover' else 48
+    top = height / 2 - (len(lines) - 1) * size * 0.6
+    body = ''.join(
+        f'<text x="50%" y="{top + index * size * 1.2:.0f}" font-size="{size}">{escape(line)}</text>'
+        for index, line in enumerate(lines)
+    )
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+            f'viewBox="0 0 {width} {height}">'
+            f'<rect width="100%" height="100%" fill="{background}"/>'
+            f'<g fill="#FFFFFF" font-family="system-ui, sans-serif" font-weight="600" '
+            f'text-anchor="middle" dominant-baseline="central">{body}</g></svg>')
+
+@bp.app_template_filter('or_placeholder')
+def or_placeholder(url, kind='cover', text=None):
+    """
+    The image URL, or our own placeholder for `kind` when there is none,
+    showing `text` (a title or a name) so cards without covers still differ.
+    """
+    if not is_placeholder(url):
+        return url
+    return url_for('main.placeholder', kind=kind, text=text or None)
@@ -0,0 +1,166 @@
+import atexit
+import threading
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import select, insert, update, delete, func
+from sqlalchemy.dialects import postgresql, sqlite
+from app.extensions import db
+from app.models import EBook, ReadingProgress
+from app.tasks import submit
+
+BATCH = 500
+
+class ProgressBuffer:
+    """
+    Latest reading/listening position per (user, e-book), held in memory
+    until the next flush. However often a reader reports, each pair costs
+    one row in the next batched upsert. One buffer per process; a restart
+    loses at most PROGRESS_FLUSH_SECONDS of positions.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.timer = None
+        self.flushing = False
+
+    def record(self, user_id, ebook_id, page=None, position=None):
+        with self.lock:
+            entry = self.pending.setdefault((user_id, ebook_id), {'page': None, 'position': None})
+            # A page turn and an audio update for the same book merge into one row
+            if page is not None:
+                entry['page'] = page
+            if position is not None:
+                entry['position'] = position
+            entry['updated_at'] = datetime.utcnow()
+            full = len(self.pending) >= self.app.config['PROGRESS_BUFFER_MAX'] and not self.flushing
+            if full:
+                self.flushing = True
+            else:
+                self._arm()
+        if full:
+            # Don't make this reader wait for everyone else's positions
+            submit(flush_progress, self)
+
+    def _arm(self):
+        # Flush on a timer started by the first update after a flush; idle processes don't wake. Hold the lock.
+        if self.timer is None and self.pending:
+            self.timer = threading.Timer(self.app.config['PROGRESS_FLUSH_SECONDS'], self.flush_in_app)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def get(self, user_id, ebook_id):
+        with self.lock:
+            entry = self.pending.get((user_id, ebook_id))
+            return dict(entry) if entry else None
+
+    def snapshot(self):
+        """A copy of what is buffered. Entries stay, and stay readable, until settle() is told they were written."""
+        with self.lock:
+            self.flushing = True
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            return {key: dict(entry) for key, entry in self.pending.items()}
+
+    def settle(self, written):
+        """Drops the entries a flush wrote, unless updated since, and rearms the timer for the rest."""
+        with self.lock:
+            for key, entry in written.items():
+                if self.pending.get(key) == entry:
+                    del self.pending[key]
+            self.flushing = False
+            self._arm()
+
+    def flush_in_app(self):
+        with self.app.app_context():
+            try:
+                flush_progress(self)
+            except Exception:
+                self.app.logger.exception("Flushing reading progress failed")
+
+def progress_buffer(app=None):
+    """The process's ProgressBuffer, created on first use and flushed at exit."""
+    app = app or current_app._get_current_object()
+    buffer = app.extensions.get('reading_progress')
+    if buffer is None:
+        buffer = ProgressBuffer(app)
+        app.extensions['reading_progress'] = buffer
+        atexit.register(buffer.flush_in_app)
+    return buffer
+
+def _upsert(rows):
+    """
+    One INSERT ... ON CONFLICT DO UPDATE per batch. Rows another process
+    wrote more recently are left alone, and a missing page or position
+    keeps the stored value.
+    """
+    dialect = db.engine.dialect.name
+    if dialect not in ('sqlite', 'postgresql'):
+        for row in rows:
+            values = {name: value for name, value in row.items() if value is not None}
+            stmt = update(ReadingProgress).filter_by(user_id=row['user_id'], ebook_id=row['ebook_id'])
+            if not db.session.execute(stmt.values(**values)).rowcount:
+                db.session.execute(insert(ReadingProgress).values(**values))
+        return
+    stmt = (postgresql if dialect == 'postgresql' else sqlite).insert(ReadingProgress)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ReadingProgress.user_id, ReadingProgress.ebook_id],
+        set_={
+            'page': func.coalesce(stmt.excluded.page, ReadingProgress.page),
+            'position': func.coalesce(stmt.excluded.position, ReadingProgress.position),
+            'updated_at': stmt.excluded.updated_at,
+        },
+        where=ReadingProgress.updated_at <= stmt.excluded.updated_at,
+    )
+    db.session.execute(stmt, rows)
+
+def flush_progress(buffer=None):
+    """
+    Writes everything buffered in batched upserts and commits. Entries
+    leave the buffer only after the commit, so a failed flush loses nothing
+    and is retried on the next timer. Returns the rows written.
+    """
+    buffer = buffer or progress_buffer()
+    pending = buffer.snapshot()
+    if not pending:
+        buffer.settle({})
+        return 0
+    try:
+        # Skip e-books deleted while their positions sat in the buffer
+        live = set(db.session.execute(
+            select(EBook.id).where(EBook.id.in_({ebook_id for _, ebook_id in pending}))
+        ).scalars())
+        rows = [dict(entry, user_id=user_id, ebook_id=ebook_id)
+                for (user_id, ebook_id), entry in pending.items() if ebook_id in live]
+        for start in range(0, len(rows), BATCH):
+            _upsert(rows[start:start + BATCH])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        buffer.settle({})
+        raise
+    buffer.settle(pending)
+    return len(rows)
+
+def record_progress(user_id, ebook_id, page=None, position=None):
+    """Buffers a reader's position; no database work happens on the request."""
+    progress_buffer().record(user_id, ebook_id, page, position)
+
+def get_progress(user_id, ebook_id):
+    """{'page', 'position'} for a user and e-book, unflushed updates first, or None."""
+    pending = progress_buffer().get(user_id, ebook_id)
+    stored = db.session.get(ReadingProgress, (user_id, ebook_id))
+    if pending is None and stored is None:
+        return None
+    progress = {}
+    for name in ('page', 'position'):
+        # 0 seconds is a real position ("start over"), so only None falls back
+        value = (pending or {}).get(name)
+        progress[name] = value if value is not None else getattr(stored, name, None)
+    return progress
+
+def purge_progress(ebook_id):
+    """Drops every reader's position in an e-book. Does not commit."""
+    db.session.execute(delete(ReadingProgress).where(ReadingProgress.ebook_id == ebook_id))
@@ -0,0 +1,84 @@
+import click
+from flask import current_app
+from sqlalchemy import select, func
+from app.extensions import db
+from app.main import bp
+from app.models import Book, SupplyOrder, SupplyOrderItem
+from app.main.export_routes import iter_csv
+from app.main.mail_utils import enqueue_emails
+from app.tasks import submit
+
+PO_HEADER = ['line', 'book_id', 'title', 'author', 'quantity', 'list_price', 'line_total']
+
+def purchase_order_lines(order_id):
+    """An order's lines joined to their books, in line order, as one SELECT."""
+    return (
+        select(SupplyOrderItem.id, Book.id, Book.title, Book.author, SupplyOrderItem.mass, Book.price,
+               SupplyOrderItem.mass * Book.price)
+        .join(Book, Book.id == SupplyOrderItem.book_id)
+        .where(SupplyOrderItem.order_id == order_id)
+        .order_by(SupplyOrderItem.id)
+    )
+
+def purchase_order_totals(order_id):
+    """(lines, units, value) for an order."""
+    return db.session.execute(
+        select(func.count(SupplyOrderItem.id), func.coalesce(func.sum(SupplyOrderItem.mass), 0),
+               func.coalesce(func.sum(SupplyOrderItem.mass * Book.price), 0))
+        .join(Book, Book.id == SupplyOrderItem.book_id)
+        .where(SupplyOrderItem.order_id == order_id)
+    ).one()
+
+def purchase_order_filename(order_id):
+    return f'purchase-order-{order_id}.csv'
+
+def send_purchase_order(order_id):
+    """
+    Builds an order's purchase-order CSV and queues it to the supplier in the
+    mail outbox, for `flask main send-mail` to deliver. Runs on a background
+    thread after authorization. Returns True if the email was queued.
+    """
+    order = db.session.get(SupplyOrder, order_id)
+    if order is None or order.supplier is None:
+        return False
+    supplier = order.supplier
+    if not supplier.email:
+        current_app.logger.warning(f"Purchase order #{order.id} not sent: {supplier.name} has no email address")
+        return False
+
+    lines, units, value = purchase_order_totals(order.id)
+    placed = (order.placed_at or order.updated_at).strftime('%Y-%m-%d')
+    enqueue_emails([{
+        'recipient': supplier.email,
+        'subject': f'Purchase Order #{order.id} - ChupChap Pathshala',
+        'body': f'''Dear {supplier.contact_person or supplier.name},
+
+Please find attached purchase order #{order.id}, placed on {placed}.
+
+Lines: {lines}
+Total units: {units}
+Value at list price: {value:.2f}
+
+Kindly confirm the delivery date by replying to this email.
+
+ChupChap Pathshala
+''',
+        'attachment_name': purchase_order_filename(order.id),
+        'attachment_type': 'text/csv',
+        'attachment': ''.join(iter_csv(PO_HEADER, purchase_order_lines(order.id))),
+    }])
+    db.session.commit()
+    return True
+
+def queue_purchase_order(order_id):
+    """Hands send_purchase_order to the background pool; returns the Future."""
+    return submit(send_purchase_order, order_id)
+
+@bp.cli.command('send-purchase-order')
+@click.argument('order_id', type=int)
+def send_purchase_order_command(order_id):
+    """Queue (or re-queue) the purchase-order email for ORDER_ID."""
+    if send_purchase_order(order_id):
+        click.echo(f'Purchase order #{order_id} queued; run `flask main send-mail` to deliver it.')
+    else:
+        click.echo(f'Purchase order #{order_id} was not queued: no such order, no supplier, or no supplier email.')
@@ -0,0 +1,313 @@
+from datetime import datetime, timedelta
+import click
+from sqlalchemy import select, insert, update, func, case, and_
+from sqlalchemy.orm import aliased
+from app.extensions import db
+from app.main import bp
+from app.models import Book, StockMovement, StockSnapshot, Loan, Sale, SupplyOrder, SupplyOrderItem
+
+COUNTERS = ('stock_total', 'stock_available', 'stock_borrowed', 'stock_sold')
+DELTAS = ('total_delta', 'available_delta', 'borrowed_delta', 'sold_delta')
+MOVEMENT_COLUMNS = ('book_id', 'reason', 'ref_id', 'user_id', 'created_at') + DELTAS
+LEDGER_CHUNK_SIZE = 1000
+SNAPSHOT_SETTLE_SECONDS = 60 # Leave in-flight transactions out of a snapshot
+
+def movement(book_id, reason, total=0, available=0, borrowed=0, sold=0, ref_id=None, user_id=None):
+    """Builds one ledger row for record_movements()."""
+    return {
+        'book_id': book_id,
+        'reason': reason,
+        'ref_id': ref_id,
+        'user_id': user_id,
+        'created_at': datetime.utcnow(),
+        'total_delta': total,
+        'available_delta': available,
+        'borrowed_delta': borrowed,
+        'sold_delta': sold,
+    }
+
+def record_movements(rows):
+    """
+    Appends ledger rows with one multi-row INSERT in the caller's transaction,
+    so a counter change and its movement commit or roll back together.
+    """
+    rows = [row for row in rows if any(row[delta] for delta in DELTAS)]
+    if rows:
+        db.session.execute(insert(StockMovement), rows)
+    return len(rows)
+
+def record_movements_from(rows):
+    """
+    Appends ledger rows straight from a SELECT of MOVEMENT_COLUMNS, for
+    set-based stock updates whose rows never come back to Python. The
+    SELECT should leave out rows where every delta is zero.
+    """
+    return db.session.execute(insert(StockMovement).from_select(MOVEMENT_COLUMNS, rows)).rowcount
+
+def edit_movement(book, before, reason='edit', user_id=None):
+    """Ledger row for an absolute overwrite of the counters, given their old values."""
+    return movement(
+        book.id, reason,
+        total=int(book.stock_total - before['stock_total']),
+        available=int(book.stock_available - before['stock_available']),
+        borrowed=int(book.stock_borrowed - before['stock_borrowed']),
+        sold=int(book.stock_sold - before['stock_sold']),
+        user_id=user_id,
+    )
+
+def ledger_balances(book_ids, as_of=None, until_id=None):
+    """
+    Stock counters per book as recorded by the ledger: the latest snapshot
+    (taken no later than `as_of`) plus every movement after it.
+    Both lookups are range reads on (book_id, taken_at) / (book_id, created_at).
+    Returns {book_id: {'stock_total': .., ..., 'last_movement_id': ..}}.
+    """
+    snapshot_filters = [StockSnapshot.book_id.in_(book_ids)]
+    if as_of is not None:
+        snapshot_filters.append(StockSnapshot.taken_at <= as_of)
+    latest = select(
+        StockSnapshot.book_id, func.max(StockSnapshot.id).label('snapshot_id')
+    ).where(*snapshot_filters).group_by(StockSnapshot.book_id).subquery()
+
+    balances = {}
+    for snapshot in db.session.scalars(
+        select(StockSnapshot).join(latest, StockSnapshot.id == latest.c.snapshot_id)
+    ):
+        balances[snapshot.book_id] = {
+            'stock_total': snapshot.stock_total,
+            'stock_available': snapshot.stock_available,
+            'stock_borrowed': snapshot.stock_borrowed,
+            'stock_sold': snapshot.stock_sold,
+            'last_movement_id': snapshot.last_movement_id,
+        }
+
+    snapshot = aliased(StockSnapshot)
+    movement_filters = [
+        StockMovement.book_id.in_(book_ids),
+        StockMovement.id > func.coalesce(snapshot.last_movement_id, 0),
+    ]
+    if as_of is not None:
+        movement_filters.append(StockMovement.created_at <= as_of)
+    if until_id is not None:
+        movement_filters.append(StockMovement.id <= until_id)
+    sums = db.session.execute(
+        select(
+            StockMovement.book_id,
+            *[func.sum(getattr(StockMovement, delta)) for delta in DELTAS],
+            func.max(StockMovement.id),
+        )
+        .outerjoin(latest, latest.c.book_id == StockMovement.book_id)
+        .outerjoin(snapshot, snapshot.id == latest.c.snapshot_id)
+        .where(*movement_filters)
+        .group_by(StockMovement.book_id)
+    )
+    for book_id, *values, last_id in sums:
+        balance = balances.setdefault(book_id, dict.fromkeys(COUNTERS, 0))
+        for counter, value in zip(COUNTERS, values):
+            balance[counter] += value or 0
+        balance['last_movement_id'] = last_id
+    return balances
+
+def stock_as_of(book_id, when):
+    """Counters for one book at a point in time, or all zeros before its first movement."""
+    balance = ledger_balances([book_id], as_of=when).get(book_id)
+    return balance or dict.fromkeys(COUNTERS, 0)
+
+def iter_book_id_chunks(chunk_size=LEDGER_CHUNK_SIZE):
+    """Walks the books table by primary key so each chunk is a short transaction."""
+    last_id = 0
+    while True:
+        ids = db.session.scalars(
+            select(Book.id).where(Book.id > last_id).order_by(Book.id).limit(chunk_size)
+        ).all()
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+def take_snapshots(chunk_size=LEDGER_CHUNK_SIZE):
+    """
+    Writes a new snapshot for every book that moved since its last one.
+    Snapshots are derived from the ledger, never from the Book counters,
+    so they stay a trustworthy base for rebuild_counters().
+    """
+    settled = datetime.utcnow() - timedelta(seconds=SNAPSHOT_SETTLE_SECONDS)
+    until_id = db.session.scalar(
+        select(func.max(StockMovement.id)).where(StockMovement.created_at <= settled)
+    ) or 0
+    written = 0
+    for ids in iter_book_id_chunks(chunk_size):
+        balances = ledger_balances(ids, until_id=until_id)
+        previous = dict(db.session.execute(
+            select(StockSnapshot.book_id, func.max(StockSnapshot.last_movement_id))
+            .where(StockSnapshot.book_id.in_(ids)).group_by(StockSnapshot.book_id)
+        ).all())
+        rows = [
+            dict(book_id=book_id, taken_at=settled, **balance)
+            for book_id, balance in balances.items()
+            if balance['last_movement_id'] != previous.get(book_id)
+        ]
+        if rows:
+            db.session.execute(insert(StockSnapshot), rows)
+        db.session.commit()
+        written += len(rows)
+    return written
+
+def rebuild_counters(chunk_size=LEDGER_CHUNK_SIZE):
+    """
+    Treats the Book counters as a cache and rewrites them from the ledger,
+    one chunk of books per UPDATE. Returns the number of books touched.
+    """
+    rebuilt = 0
+    for ids in iter_book_id_chunks(chunk_size):
+        balances = ledger_balances(ids)
+        if balances:
+            values = {
+                counter: case({book_id: balance[counter] for book_id, balance in balances.items()},
+                              value=Book.id)
+                for counter in COUNTERS
+            }
+            db.session.execute(
+                update(Book).where(Book.id.in_(balances.keys()))
+                .values(version_id=Book.version_id + 1, **values),
+                execution_options={'synchronize_session': False}
+            )
+        db.session.commit()
+        rebuilt += len(balances)
+    return rebuilt
+
+def _expected_counters(ids):
+    """
+    Recomputes what the counters should be for one chunk of books from the
+    source records, with one grouped aggregate per table.
+    """
+    open_loans = dict(db.session.execute(
+        select(Loan.book_id, func.count(Loan.id))
+        .where(Loan.book_id.in_(ids), Loan.status.in_(('active', 'overdue')))
+        .group_by(Loan.book_id)
+    ).all())
+    sales = dict(db.session.execute(
+        select(Sale.book_id, func.count(Sale.id))
+        .where(Sale.book_id.in_(ids)).group_by(Sale.book_id)
+    ).all())
+    received = dict(db.session.execute(
+        select(SupplyOrderItem.book_id,
+               func.sum(func.coalesce(SupplyOrderItem.payload, SupplyOrderItem.mass)))
+        .join(SupplyOrder, SupplyOrder.id == SupplyOrderItem.order_id)
+        .where(SupplyOrderItem.book_id.in_(ids), SupplyOrder.status == 'completed')
+        .group_by(SupplyOrderItem.book_id)
+    ).all())
+    return open_loans, sales, received
+
+def check_counters(repair=False, chunk_size=LEDGER_CHUNK_SIZE, report=None):
+    """
+    Compares the Book counters against Loan, Sale and SupplyOrderItem, one
+    chunk of books per short transaction so checkouts are never blocked.
+
+    stock_borrowed must equal the open loans, stock_sold the sales, and
+    stock_total must equal available + borrowed + sold. Units received from
+    suppliers are a floor for stock_total and only reported.
+
+    With repair=True, borrowed and sold are reset from the source records
+    and total is recomputed around the current stock_available. Each UPDATE
+    only applies if the counters are still the values that were checked, so
+    a checkout committing in between is left alone until the next run.
+    """
+    found = 0
+    repaired = 0
+    for ids in iter_book_id_chunks(chunk_size):
+        # Counters first: a checkout landing after this read fails the repair guard
+        books = db.session.execute(
+            select(Book.id, Book.title, *[getattr(Book, counter) for counter in COUNTERS])
+            .where(Book.id.in_(ids))
+        ).all()
+        open_loans, sales, received = _expected_counters(ids)
+
+        fixes = {}
+        for book in books:
+            current = {counter: getattr(book, counter) or 0 for counter in COUNTERS}
+            expected = dict(current)
+            expected['stock_borrowed'] = open_loans.get(book.id, 0)
+            expected['stock_sold'] = sales.get(book.id, 0)
+            expected['stock_total'] = (current['stock_available'] + expected['stock_borrowed']
+                                       + expected['stock_sold'])
+            problems = [
+                f"{counter} is {current[counter]}, expected {expected[counter]}"
+                for counter in COUNTERS if current[counter] != expected[counter]
+            ]
+            if expected['stock_total'] < received.get(book.id, 0):
+                problems.append(f"stock_total {expected['stock_total']} is below "
+                                f"{received[book.id]} units received from suppliers")
+            if problems:
+                found += 1
+                if report:
+                    report(book.id, book.title, problems)
+                if expected != current:
+                    fixes[book.id] = (current, expected)
+
+        if repair and fixes:
+            guard = [
+                getattr(Book, counter) == case({book_id: fix[0][counter] for book_id, fix in fixes.items()},
+                                               value=Book.id)
+                for counter in COUNTERS
+            ]
+            values = {
+                counter: case({book_id: fix[1][counter] for book_id, fix in fixes.items()}, value=Book.id)
+                for counter in COUNTERS
+            }
+            updated = db.session.scalars(
+                update(Book).where(Book.id.in_(fixes.keys()), and_(*guard))
+                .values(version_id=Book.version_id + 1, **values)
+                .returning(Book.id),
+                execution_options={'synchronize_session': False}
+            ).all()
+            record_movements(
+                movement(book_id, 'repair', **{
+                    delta.split('_')[0]: fixes[book_id][1][counter] - fixes[book_id][0][counter]
+                    for counter, delta in zip(COUNTERS, DELTAS)
+                })
+                for book_id in updated
+            )
+            repaired += len(updated)
+        db.session.commit()
+    return found, repaired
+
+def close_ledger(book, user_id=None):
+    """
+    Ahead of deleting a book: one 'delete' movement takes its counters to
+    zero. Its movements and snapshots stay, so the ledger keeps the book's
+    history and still balances.
+    """
+    return record_movements([movement(
+        book.id, 'delete',
+        total=-(book.stock_total or 0),
+        available=-(book.stock_available or 0),
+        borrowed=-(book.stock_borrowed or 0),
+        sold=-(book.stock_sold or 0),
+        user_id=user_id,
+    )])
+
+@bp.cli.command('stock-snapshot')
+@click.option('--chunk-size', type=int, default=LEDGER_CHUNK_SIZE, help='Books per transaction.')
+def stock_snapshot_command(chunk_size):
+    """Snapshot stock for every book that moved since the last snapshot."""
+    written = take_snapshots(chunk_size)
+    click.echo(f'{written} snapshot(s) written.')
+
+@bp.cli.command('check-stock')
+@click.option('--repair', is_flag=True, help='Fix borrowed, sold and total counters in place.')
+@click.option('--chunk-size', type=int, default=LEDGER_CHUNK_SIZE, help='Books per transaction.')
+def check_stock_command(repair, chunk_size):
+    """Report (and optionally repair) drifted Book stock counters."""
+    def report(book_id, title, problems):
+        click.echo(f"#{book_id} {title}: " + '; '.join(problems))
+
+    found, repaired = check_counters(repair=repair, chunk_size=chunk_size, report=report)
+    click.echo(f'{found} book(s) with discrepancies, {repaired} repaired.')
+
+@bp.cli.command('stock-rebuild')
+@click.option('--chunk-size', type=int, default=LEDGER_CHUNK_SIZE, help='Books per transaction.')
+def stock_rebuild_command(chunk_size):
+    """Rebuild the Book stock counters from the movement ledger."""
+    rebuilt = rebuild_counters(chunk_size)
+    click.echo(f'{rebuilt} book(s) rebuilt from the ledger.')
@@ -0,0 +1,22 @@
+from flask_wtf import FlaskForm
+from wtforms import StringField, SubmitField
+from wtforms.validators import DataRequired, Optional, Email, Length
+
+class SupplierForm(FlaskForm):
+    name = StringField(
+        "Name",
+        validators=[DataRequired(), Length(min=1, max=100)]
+    )
+    contact_person = StringField(
+        "Contact Person",
+        validators=[Optional(), Length(max=100)]
+    )
+    email = StringField(
+        "Email",
+        validators=[Optional(), Email(), Length(max=120)]
+    )
+    phone = StringField(
+        "Phone",
+        validators=[Optional(), Length(max=20)]
+    )
+    submit = SubmitField("Add Supplier")
@@ -1,19 +1,24 @@
-from flask import render_template, redirect, url_for, flash, request
+from flask import render_template, redirect, url_for, flash, request, jsonify, stream_template, abort
 from flask_login import login_required, current_user
 from app.main import bp
 from app import db
-from app.models import Book, SupplyOrder, SupplyOrderItem, User
-
-THRESHOLD = 5
-
-def get_or_create_shortlist():
-    # Find an active shortlist (draft) order
-    order = SupplyOrder.query.filter_by(status='shortlist').first()
-    if not order:
-        order = SupplyOrder(status='shortlist')
-        db.session.add(order)
-        db.session.commit()
-    return order
+from datetime import datetime
+from app.models import (
+    Book, SupplyOrder, SupplyOrderItem, User, DemandForecast, Supplier, SupplierStats
+)
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from app.main.supplier_forms import SupplierForm
+from app.main.analytics_utils import record_order_placed, supplier_trends
+from app.main.export_routes import EXPORT_BATCH_SIZE, csv_response
+from app.main.purchase_order_utils import (
+    PO_HEADER, purchase_order_lines, purchase_order_totals, purchase_order_filename, queue_purchase_order
+)
+from app.main.supplier_utils import (
+    DEFAULT_MASS, PAYLOAD_MAX_FACTOR, get_or_create_shortlist, populate_shortlist, parse_payloads, save_payloads,
+    fuse_supply_order
+)
 
 @bp.route('/supplier/shortlist', methods=['GET', 'POST'])
 @login_required
@@ -22,38 +27,41 @@ def supplier_shortlist():
         flash('Access denied: Staff only.', 'danger')
         return redirect(url_for('main.index'))
 
-    # 1. Access the Anti-Gravity Well (Get active bucket)
+    # Access the Anti-Gravity Well (Get active bucket).
+    # Low-stock books float up when checkouts and edits push them under
+    # their reorder point, so viewing the page never rescans the catalogue.
     order = get_or_create_shortlist()
-
-    # 2. auto-pull: Anti-Gravity Effect
-    # Find all low stock books
-    low_stock_books = Book.query.filter(Book.stock_available < THRESHOLD).all()
-    
-    # Get IDs of books already in the shortlist
-    existing_item_book_ids = [item.book_id for item in order.items]
-    
-    items_added = 0
-    for book in low_stock_books:
-        # If book defies gravity (low stock) and isn't already floating (in list)
-        if book.id not in existing_item_book_ids:
-            # Lift it up!
-            new_item = SupplyOrderItem(order_id=order.id, book_id=book.id, mass=5) # Default mass
-            db.session.add(new_item)
-            items_added += 1
-    
-    if items_added > 0:
-        db.session.commit()
-        if items_added == 1:
-            flash(f'1 item floated up to the shortlist due to low stock.', 'info')
-        else:
-            flash(f'{items_added} items floated up to the shortlist due to low stock.', 'info')
+    db.session.commit()
 
     items = order.items.all()
+    # Cached by `flask main forecast-demand`; shown next to each book's stock
+    forecasts = {
+        forecast.book_id: forecast for forecast in
+        DemandForecast.query.filter(DemandForecast.book_id.in_([item.book_id for item in items]))
+    }
     
     # Calculate total mass
     total_mass = sum(item.mass for item in items)
 
-    return render_template('supplier/shortlist.html', order=order, items=items, total_mass=total_mass)
+    return render_template('supplier/shortlist.html', order=order, items=items, total_mass=total_mass,
+                           forecasts=forecasts)
+
+@bp.route('/supplier/refresh', methods=['POST'])
+@login_required
+def supplier_refresh():
+    if not current_user.is_staff():
+        return redirect(url_for('main.index'))
+
+    # Anti-Gravity Effect: pull in every low stock book in one statement
+    items_added = populate_shortlist()
+    db.session.commit()
+    if items_added == 1:
+        flash('1 item floated up to the shortlist due to low stock.', 'info')
+    elif items_added:
+        flash(f'{items_added} items floated up to the shortlist due to low stock.', 'info')
+    else:
+        flash('No new low stock books to float up.', 'info')
+    return redirect(url_for('main.supplier_shortlist'))
 
 @bp.route('/supplier/lift/<int:book_id>', methods=['POST'])
 @login_required
@@ -68,10 +76,15 @@ def supplier_lift(book_id):
     if existing:
         flash('This book is already in the shortlist.', 'warning')
     else:
-        new_item = SupplyOrderItem(order_id=order.id, book_id=book_id, mass=5)
+        new_item = SupplyOrderItem(order_id=order.id, book_id=book_id, mass=DEFAULT_MASS)
         db.session.add(new_item)
-        db.session.commit()
-        flash('Manual Lift applied! Book added to shortlist.', 'success')
+        try:
+            db.session.commit()
+            flash('Manual Lift applied! Book added to shortlist.', 'success')
+        except IntegrityError:
+            # Lifted by someone else a moment ago
+            db.session.rollback()
+            flash('This book is already in the shortlist.', 'warning')
         
     return redirect(url_for('main.supplier_shortlist'))
 
@@ -131,7 +144,8 @@ def supplier_review():
     
     # Review Beacon: Find orders pending review
     orders = SupplyOrder.query.filter_by(status='pending_review').all()
-    return render_template('supplier/review.html', orders=orders)
+    suppliers = Supplier.query.order_by(Supplier.name).all()
+    return render_template('supplier/review.html', orders=orders, suppliers=suppliers)
 
 @bp.route('/supplier/launch/<int:order_id>', methods=['POST'])
 @login_required
@@ -139,14 +153,101 @@ def supplier_launch(order_id):
     if not current_user.is_admin():
         return redirect(url_for('main.index'))
 
-    order = SupplyOrder.query.get_or_404(order_id)
-    order.status = 'placed'
-    # Here we would send email to supplier
-    
+    SupplyOrder.query.get_or_404(order_id)
+    supplier = db.session.get(Supplier, request.form.get('supplier_id', 0, type=int))
+    if supplier is None:
+        flash('Choose a supplier before authorizing the order.', 'warning')
+        return redirect(url_for('main.supplier_review'))
+
+    # Only one authorization counts, however many times the button is pressed
+    placed_at = datetime.utcnow()
+    launched = db.session.execute(
+        update(SupplyOrder)
+        .where(SupplyOrder.id == order_id, SupplyOrder.status == 'pending_review')
+        .values(status='placed', supplier_id=supplier.id, placed_at=placed_at)
+        .returning(SupplyOrder.id),
+        execution_options={'synchronize_session': False}
+    ).first()
+    if launched is None:
+        flash('This order is no longer waiting for authorization.', 'warning')
+        return redirect(url_for('main.supplier_review'))
+    record_order_placed(order_id, supplier.id, placed_at)
     db.session.commit()
-    flash('Order Authorized! & transmitted to supplier.', 'success')
+
+    # Build and queue the purchase order off the request, however large it is
+    queue_purchase_order(order_id)
+    if supplier.email:
+        flash(f'Order Authorized! Purchase order is being sent to {supplier.email}.', 'success')
+    else:
+        flash(f'Order Authorized! {supplier.name} has no email address; '
+              'send them the purchase order by hand.', 'warning')
     return redirect(url_for('main.supplier_review'))
 
+def purchase_order_for(order_id):
+    order = SupplyOrder.query.options(joinedload(SupplyOrder.supplier)).get_or_404(order_id)
+    if order.status not in ('placed', 'completed'):
+        abort(404)
+    return order
+
+@bp.route('/supplier/orders/<int:order_id>/purchase-order.csv', methods=['GET'])
+@login_required
+def purchase_order_csv(order_id):
+    if not current_user.is_staff():
+        return redirect(url_for('main.index'))
+
+    order = purchase_order_for(order_id)
+    return csv_response(purchase_order_filename(order.id), PO_HEADER, purchase_order_lines(order.id))
+
+@bp.route('/supplier/orders/<int:order_id>/purchase-order', methods=['GET'])
+@login_required
+def purchase_order_print(order_id):
+    if not current_user.is_staff():
+        return redirect(url_for('main.index'))
+
+    order = purchase_order_for(order_id)
+
+    def rows():
+        # Runs while the page streams, so lines go out straight off the cursor
+        yield from db.session.execute(
+            purchase_order_lines(order.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+
+    return stream_template('supplier/purchase_order.html', order=order, rows=rows(),
+                           totals=purchase_order_totals(order.id))
+
+@bp.route('/supplier/suppliers', methods=['GET', 'POST'])
+@login_required
+def supplier_list():
+    if not current_user.is_admin():
+        flash('Access denied: Owner/Admin only.', 'danger')
+        return redirect(url_for('main.index'))
+
+    form = SupplierForm()
+    if form.validate_on_submit():
+        supplier = Supplier(name=form.name.data, contact_person=form.contact_person.data,
+                            email=form.email.data, phone=form.phone.data)
+        db.session.add(supplier)
+        db.session.commit()
+        flash(f"Supplier '{supplier.name}' added.", 'success')
+        return redirect(url_for('main.supplier_list'))
+
+    suppliers = Supplier.query.order_by(Supplier.name).all()
+    return render_template('supplier/suppliers.html', form=form, suppliers=suppliers)
+
+@bp.route('/supplier/analytics', methods=['GET'])
+@login_required
+def supplier_analytics():
+    if not current_user.is_admin():
+        flash('Access denied: Owner/Admin only.', 'danger')
+        return redirect(url_for('main.index'))
+
+    # Reads only the rollups kept by analytics_utils, never the orders themselves
+    stats = (SupplierStats.query.options(joinedload(SupplierStats.supplier))
+             .order_by(SupplierStats.spend.desc()).all())
+    months, trends = supplier_trends()
+    peak = max((row.spend for rows in trends.values() for row in rows.values()), default=0)
+    return render_template('supplier/analytics.html', stats=stats, months=months, trends=trends, peak=peak)
+
 @bp.route('/supplier/receive_list', methods=['GET'])
 @login_required
 def supplier_receive_list():
@@ -164,30 +265,39 @@ def supplier_receive_detail(order_id):
          return redirect(url_for('main.index'))
          
     order = SupplyOrder.query.get_or_404(order_id)
-    return render_template('supplier/receive.html', order=order)
+    items = order.items.options(joinedload(SupplyOrderItem.book)).order_by(SupplyOrderItem.id).all()
+    return render_template('supplier/receive.html', order=order, items=items, max_factor=PAYLOAD_MAX_FACTOR)
 
-@bp.route('/supplier/update_payload/<int:item_id>', methods=['POST'])
+@bp.route('/supplier/receive/<int:order_id>/payloads', methods=['POST'])
 @login_required
-def supplier_update_payload(item_id):
-    item = SupplyOrderItem.query.get_or_404(item_id)
-    if item.order.status != 'placed':
-        flash('Cannot update payload for this order.', 'danger')
-        return redirect(url_for('main.supplier_receive_detail', order_id=item.order.id))
-        
-    action = request.form.get('action') # 'increase' or 'decrease'
-    
-    # Initialize payload if None
-    if item.payload is None:
-        item.payload = item.mass
-        
-    if action == 'increase':
-        item.payload += 1
-    elif action == 'decrease':
-        if item.payload > 0:
-            item.payload -= 1
-            
+def supplier_save_payloads(order_id):
+    if not current_user.is_staff():
+        return jsonify({'success': False, 'errors': ['Staff only.']}), 403
+
+    order = SupplyOrder.query.get_or_404(order_id)
+    if order.status != 'placed':
+        return jsonify({'success': False, 'errors': ['This order is no longer open for receiving.']}), 409
+
+    # The whole receive screen in one request: keyed-in counts and/or scanned codes
+    data = request.get_json(silent=True)
+    if (not isinstance(data, dict) or not isinstance(data.get('payloads') or {}, dict)
+            or not isinstance(data.get('scans') or [], list)):
+        return jsonify({'success': False,
+                        'errors': ['Send a JSON object with payloads by line id and/or a list of scans.']}), 400
+    values, errors = parse_payloads(order.id, data.get('payloads'), data.get('scans'))
+    if errors:
+        return jsonify({'success': False, 'errors': errors}), 400
+
+    rows = save_payloads(order.id, values)
+    if len(rows) != len(values):
+        # Fused by someone else between the status check and the update
+        db.session.rollback()
+        return jsonify({'success': False, 'errors': ['This order is no longer open for receiving.']}), 409
     db.session.commit()
-    return redirect(url_for('main.supplier_receive_detail', order_id=item.order.id))
+    return jsonify({
+        'success': True,
+        'items': [{'id': row.id, 'mass': row.mass, 'payload': row.payload} for row in rows],
+    })
 
 @bp.route('/supplier/fusion/<int:order_id>', methods=['POST'])
 @login_required
@@ -198,23 +308,15 @@ def supplier_fusion(order_id):
         return redirect(url_for('main.supplier_receive_list'))
         
     # INVENTORY FUSION
-    for item in order.items:
-        # If payload wasn't set, assume full delivery (or 0? Let's assume full if untouched, or check logic. 
-        # Plan says "Librarian enters actual quantity". If they didn't touch it, item.payload is None.
-        # Let's default to item.mass if None, or 0? 
-        # "The system displays the ordered quantity as the default" -> implies payload default = mass.
-        qty_received = item.payload if item.payload is not None else item.mass
-        
-        # Update Book Stock
-        item.book.stock_total += qty_received
-        item.book.stock_available += qty_received
-        
-        # Update payload field for record keeping if it was None
-        if item.payload is None:
-            item.payload = qty_received
-            
-    order.status = 'completed'
+    # The receive screen shows the ordered quantity as the default, so an
+    # untouched payload means the line arrived in full.
+    fused = fuse_supply_order(order.id, user_id=current_user.id)
+    if fused is None:
+        db.session.rollback()
+        flash('Order not ready for fusion.', 'danger')
+        return redirect(url_for('main.supplier_receive_list'))
     db.session.commit()
     
-    flash('Inventory Fusion Complete! Stock updated.', 'success')
+    books, units = fused
+    flash(f'Inventory Fusion Complete! {units} copies added across {books} books.', 'success')
     return redirect(url_for('main.supplier_receive_list'))
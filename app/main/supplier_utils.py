@@ -0,0 +1,209 @@
+from datetime import datetime
+import click
+from sqlalchemy import select, insert, update, exists, literal, func, case
+from sqlalchemy.exc import IntegrityError
+from app.extensions import db
+from app.main import bp
+from app.models import Book, SupplyOrder, SupplyOrderItem, DemandForecast
+from app.main.stock_utils import record_movements_from
+from app.main.circulation_utils import parse_scan_codes
+from app.main.analytics_utils import record_order_completed
+
+THRESHOLD = 5 # Reorder point for books without a demand forecast
+DEFAULT_MASS = 5 # Order quantity for books without a demand forecast
+PAYLOAD_MAX_FACTOR = 2 # A count over twice the ordered mass is taken as a keying slip
+
+def get_or_create_shortlist():
+    """
+    Returns the single open shortlist order, creating it if needed. The
+    partial unique index on supply_orders.status lets only one 'shortlist'
+    row exist, so when two staff create it at once the loser's savepoint
+    rolls back and it picks up the winner's row. Nothing is committed here.
+    """
+    order = SupplyOrder.query.filter_by(status='shortlist').first()
+    if order:
+        return order
+    try:
+        with db.session.begin_nested():
+            order = SupplyOrder(status='shortlist')
+            db.session.add(order)
+    except IntegrityError:
+        order = SupplyOrder.query.filter_by(status='shortlist').one()
+    return order
+
+def reorder_points(book_ids):
+    """{book_id: reorder point}, from the demand forecast or THRESHOLD."""
+    points = dict(db.session.execute(
+        select(DemandForecast.book_id, DemandForecast.reorder_point)
+        .where(DemandForecast.book_id.in_(book_ids))
+    ).all())
+    return {book_id: points.get(book_id, THRESHOLD) for book_id in book_ids}
+
+def crossed_threshold(before, after, threshold=THRESHOLD):
+    """True when stock_available went from the reorder point or more to below it."""
+    return before >= threshold > after
+
+def populate_shortlist(book_ids=None):
+    """
+    Floats low-stock books onto the shortlist with one
+    INSERT ... SELECT ... WHERE NOT EXISTS in the caller's transaction.
+    A book is low once stock_available is under its forecast reorder point
+    (THRESHOLD if it has none) and is ordered in its suggested quantity.
+    Pass book_ids to limit it to the books a stock change touched; None
+    sweeps the whole catalogue. Returns the number of items added.
+    """
+    if book_ids is not None and not book_ids:
+        return 0
+    order = get_or_create_shortlist()
+    db.session.flush()
+
+    low_stock = (
+        select(literal(order.id), Book.id, func.coalesce(DemandForecast.suggested_qty, DEFAULT_MASS))
+        .outerjoin(DemandForecast, DemandForecast.book_id == Book.id)
+        .where(Book.stock_available < func.coalesce(DemandForecast.reorder_point, THRESHOLD))
+        .where(~exists().where(SupplyOrderItem.order_id == order.id,
+                               SupplyOrderItem.book_id == Book.id))
+    )
+    if book_ids is not None:
+        low_stock = low_stock.where(Book.id.in_(book_ids))
+    stmt = insert(SupplyOrderItem).from_select(['order_id', 'book_id', 'mass'], low_stock)
+
+    try:
+        with db.session.begin_nested():
+            return db.session.execute(stmt).rowcount
+    except IntegrityError:
+        # Another transaction shortlisted some of the same books first;
+        # NOT EXISTS now sees their rows and skips them.
+        with db.session.begin_nested():
+            return db.session.execute(stmt).rowcount
+
+def parse_payloads(order_id, payloads=None, scans=None):
+    """
+    Validates received quantities for a placed order. payloads maps item ids
+    to keyed-in counts; scans is a list of book codes ('B7' or '7'), one per
+    copy unpacked, and sets each scanned line to the number of its scans.
+    Counts must be whole numbers from 0 to PAYLOAD_MAX_FACTOR times the
+    line's mass. Returns ({item_id: payload}, errors).
+    """
+    lines = {
+        row.id: row for row in db.session.execute(
+            select(SupplyOrderItem.id, SupplyOrderItem.book_id, SupplyOrderItem.mass)
+            .where(SupplyOrderItem.order_id == order_id)
+        )
+    }
+    values = {}
+    errors = []
+
+    for item_id, count in (payloads or {}).items():
+        try:
+            item_id = int(item_id)
+        except (TypeError, ValueError):
+            errors.append(f'Unknown line {item_id!r}.')
+            continue
+        if item_id not in lines:
+            errors.append(f'Line #{item_id} is not on order #{order_id}.')
+        elif isinstance(count, bool) or not str(count).strip().isdigit():
+            errors.append(f'Line #{item_id}: {count!r} is not a whole number of copies.')
+        else:
+            values[item_id] = int(count)
+
+    loan_ids, book_counts, invalid = parse_scan_codes(str(code) for code in (scans or []))
+    if loan_ids or invalid:
+        errors.append('Not book codes: ' + ', '.join(invalid + [f'L{loan_id}' for loan_id in sorted(loan_ids)]))
+    by_book = {line.book_id: line.id for line in lines.values()}
+    for book_id, count in book_counts.items():
+        item_id = by_book.get(book_id)
+        if item_id is None:
+            errors.append(f'Book #{book_id} was scanned but is not on order #{order_id}.')
+        elif item_id in values:
+            errors.append(f'Line #{item_id} was both keyed in and scanned.')
+        else:
+            values[item_id] = count
+
+    for item_id, count in values.items():
+        limit = lines[item_id].mass * PAYLOAD_MAX_FACTOR
+        if count > limit:
+            errors.append(f'Line #{item_id}: {count} received is more than {limit} '
+                          f'(ordered {lines[item_id].mass}).')
+    return values, errors
+
+def save_payloads(order_id, values):
+    """
+    Stores received quantities with one CASE UPDATE, only while the order is
+    still 'placed'. Returns the (id, mass, payload) rows written.
+    """
+    if not values:
+        return []
+    return db.session.execute(
+        update(SupplyOrderItem)
+        .where(SupplyOrderItem.order_id == order_id, SupplyOrderItem.id.in_(values.keys()),
+               exists().where(SupplyOrder.id == order_id, SupplyOrder.status == 'placed'))
+        .values(payload=case(values, value=SupplyOrderItem.id))
+        .returning(SupplyOrderItem.id, SupplyOrderItem.mass, SupplyOrderItem.payload),
+        execution_options={'synchronize_session': False}
+    ).all()
+
+def fuse_supply_order(order_id, user_id=None):
+    """
+    Adds a placed order's received payloads to the live stock in the caller's
+    transaction, without loading its items: one UPDATE of the books from
+    supply_order_items and one INSERT ... SELECT into the stock ledger, so a
+    delivery costs the same few statements whatever its size. Lines never
+    adjusted on the receive screen count as received in full.
+
+    Returns (books, units) updated, or None if the order is not 'placed'
+    (for instance when someone else has just fused it).
+    """
+    completed_at = datetime.utcnow()
+    claimed = db.session.execute(
+        update(SupplyOrder)
+        .where(SupplyOrder.id == order_id, SupplyOrder.status == 'placed')
+        .values(status='completed', completed_at=completed_at)
+        .returning(SupplyOrder.supplier_id, SupplyOrder.placed_at),
+        execution_options={'synchronize_session': False}
+    ).first()
+    if claimed is None:
+        return None
+
+    db.session.execute(
+        update(SupplyOrderItem)
+        .where(SupplyOrderItem.order_id == order_id, SupplyOrderItem.payload.is_(None))
+        .values(payload=SupplyOrderItem.mass),
+        execution_options={'synchronize_session': False}
+    )
+    if claimed.supplier_id:
+        record_order_completed(order_id, claimed.supplier_id, claimed.placed_at, completed_at)
+
+    received = SupplyOrderItem.order_id == order_id, SupplyOrderItem.payload > 0
+    # One line per book, guaranteed by uq_supply_order_items_order_book
+    payload = (
+        select(SupplyOrderItem.payload)
+        .where(SupplyOrderItem.order_id == order_id, SupplyOrderItem.book_id == Book.id)
+        .scalar_subquery()
+    )
+    books = db.session.execute(
+        update(Book)
+        .where(Book.id.in_(select(SupplyOrderItem.book_id).where(*received)))
+        .values(stock_total=Book.stock_total + payload,
+                stock_available=Book.stock_available + payload,
+                version_id=Book.version_id + 1),
+        execution_options={'synchronize_session': False}
+    ).rowcount
+
+    record_movements_from(
+        select(SupplyOrderItem.book_id, literal('supply'), literal(order_id), literal(user_id, db.Integer),
+               literal(completed_at), SupplyOrderItem.payload, SupplyOrderItem.payload,
+               literal(0), literal(0))
+        .where(*received)
+    )
+    units = db.session.scalar(
+        select(func.coalesce(func.sum(SupplyOrderItem.payload), 0)).where(*received)
+    )
+    return books, units
+
+@bp.cli.command('refresh-shortlist')
+def refresh_shortlist_command():
+    """Add every book below its reorder point to the shortlist."""
+    added = populate_shortlist()
+    db.session.commit()
+    click.echo(f'{added} book(s) added to the shortlist.')
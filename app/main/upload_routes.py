@@ -1,10 +1,9 @@
-import os
-import time
-from werkzeug.utils import secure_filename
-from flask import request, jsonify, current_app, url_for
+from flask import request, jsonify
 from app import db
 from app.main import bp
 from app.models import Book
+from app.main.blob_utils import store_blob, release_blob, blob_url, parse_blob_url, extension_of
+from app.main.cover_utils import queue_variants
 from app.decorators import staff_required
 from flask_login import login_required
 
@@ -28,31 +27,15 @@ def upload_cover(book_id):
         
     if file and allowed_file(file.filename):
         book = Book.query.get_or_404(book_id)
-        
-        # Secure filename and add timestamp to prevent caching/collisions
-        original_filename = secure_filename(file.filename)
-        extension = original_filename.rsplit('.', 1)[1].lower()
-        new_filename = f"book_{book_id}_{int(time.time())}.{extension}"
-        
-        # Ensure directory exists
-        if not os.path.exists(current_app.config['UPLOAD_FOLDER']):
-            os.makedirs(current_app.config['UPLOAD_FOLDER'])
-            
-        file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], new_filename))
-        
-        # Update Database - Store relative path for frontend
-        # Note: 'static/uploads/covers/...' is how we access it in templates
-        # We need to construct the full URL or consistent path. 
-        # Given existing data uses full URLs in some cases, let's stick to a consistent path pattern.
-        # However, `url_for('static', ...)` is best practice. 
-        # But `book.image_url` is a string. Let's store the full url path relative to root or absolute?
-        # The template uses `img src="{{ book.image_url }}"`.
-        # So we should store: `/static/uploads/covers/filename`
-        
-        image_path = url_for('static', filename=f'uploads/covers/{new_filename}')
-        book.image_url = image_path
+
+        # Stored once by content hash; the hash URL changes with the image, so browsers never see a stale cover
+        old_url = book.image_url
+        book.image_url = blob_url(store_blob(file), extension_of(file.filename))
+        release_blob(parse_blob_url(old_url))
         db.session.commit()
-        
-        return jsonify({'success': True, 'image_url': image_path})
+
+        # The catalog's card sizes are rendered off the request; until then the original is served
+        queue_variants(book.image_url)
+        return jsonify({'success': True, 'image_url': book.image_url})
         
     return jsonify({'error': 'File type not allowed'}), 400
@@ -0,0 +1,153 @@
+import os
+import hashlib
+import secrets
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from werkzeug.utils import secure_filename
+from app.extensions import db
+from app.main import bp
+from app.models import UploadSession, UploadChunk
+from app.main.blob_utils import blob_name, extension_of, store_blob_file
+
+UPLOAD_EXTENSIONS = {'pdf': {'pdf'}, 'audio': {'mp3', 'wav'}}
+COPY_BLOCK = 64 * 1024
+
+def upload_folder():
+    return os.path.join(current_app.config['EBOOK_FOLDER'], 'uploads')
+
+def part_path(upload):
+    return os.path.join(upload_folder(), f'{upload.id}.part')
+
+def upload_errors(kind, filename, size, sha256=None):
+    """Checks a new upload's declared metadata; returns a list of messages."""
+    errors = []
+    if not isinstance(kind, str) or kind not in UPLOAD_EXTENSIONS:
+        return ['Unknown upload kind.']
+    if not isinstance(filename, str):
+        filename = ''
+    extension = (filename or '').rsplit('.', 1)[-1].lower() if '.' in (filename or '') else ''
+    if extension not in UPLOAD_EXTENSIONS[kind]:
+        errors.append(f"Only {', '.join(sorted(UPLOAD_EXTENSIONS[kind])).upper()} files can be uploaded here.")
+    if not isinstance(size, int) or size <= 0:
+        errors.append('File size must be a positive number of bytes.')
+    elif size > current_app.config['UPLOAD_MAX_SIZE']:
+        errors.append(f"Files are limited to {current_app.config['UPLOAD_MAX_SIZE'] // (1024 * 1024)} MB.")
+    if sha256 is not None and (not isinstance(sha256, str) or len(sha256) != 64):
+        errors.append('Checksum must be a hex SHA-256 digest.')
+    return errors
+
+def upload_filename(filename):
+    """
+    A safe name for the session that keeps the extension upload_errors
+    checked: secure_filename drops non-ASCII names ('বই.pdf' becomes 'pdf'),
+    and the stored blob's type comes from the extension.
+    """
+    name = secure_filename(filename)
+    extension = extension_of(filename)
+    return name if extension_of(name) == extension else f'upload.{extension}'
+
+def start_upload(user_id, kind, filename, size, sha256=None):
+    """
+    Opens an upload session and reserves its .part file at full size, so
+    chunks can be written at their offsets in any order. Does not commit.
+    """
+    upload = UploadSession(
+        id=secrets.token_hex(16),
+        user_id=user_id,
+        kind=kind,
+        filename=upload_filename(filename),
+        size=size,
+        chunk_size=current_app.config['UPLOAD_CHUNK_SIZE'],
+        sha256=sha256.lower() if sha256 else None,
+    )
+    os.makedirs(upload_folder(), exist_ok=True)
+    with open(part_path(upload), 'wb') as part:
+        part.truncate(size)
+    db.session.add(upload)
+    return upload
+
+def received_chunks(upload):
+    return sorted(index for (index,) in db.session.query(UploadChunk.index).filter_by(upload_id=upload.id))
+
+def write_chunk(upload, index, stream, sha256):
+    """
+    Copies one chunk from the request stream into the .part file at its
+    offset, hashing as it goes, and records it once the checksum matches.
+    Nothing is held in memory beyond one copy block. Returns an error
+    message, or None. Does not commit.
+    """
+    if not 0 <= index < upload.chunk_count:
+        return 'No such chunk.'
+    expected = upload.chunk_length(index)
+    digest = hashlib.sha256()
+    written = 0
+    with open(part_path(upload), 'r+b') as part:
+        part.seek(index * upload.chunk_size)
+        while True:
+            block = stream.read(min(COPY_BLOCK, expected + 1 - written))
+            if not block:
+                break
+            written += len(block)
+            if written > expected:
+                return f'Chunk {index} should be {expected} bytes.'
+            part.write(block)
+            digest.update(block)
+    if written != expected:
+        return f'Chunk {index} should be {expected} bytes, got {written}.'
+    if digest.hexdigest() != (sha256 or '').lower():
+        # Left unrecorded, so the client sends it again
+        return f'Chunk {index} failed its checksum.'
+
+    # A resent chunk replaces its earlier record
+    db.session.merge(UploadChunk(upload_id=upload.id, index=index, sha256=digest.hexdigest()))
+    upload.updated_at = datetime.utcnow()
+    return None
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(COPY_BLOCK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def ready_upload(upload_id, kind, user_id):
+    """
+    The caller's session for a finished upload of `kind`, or (None, message)
+    if it is unknown, incomplete or fails the whole-file checksum.
+    """
+    upload = db.session.get(UploadSession, upload_id)
+    if upload is None or upload.user_id != user_id or upload.kind != kind:
+        return None, 'The upload could not be found; please choose the file again.'
+    missing = upload.chunk_count - len(received_chunks(upload))
+    if missing:
+        return None, f'The upload of {upload.filename} is missing {missing} chunk(s).'
+    if upload.sha256 and _file_sha256(part_path(upload)) != upload.sha256:
+        return None, f'{upload.filename} arrived damaged; please upload it again.'
+    return upload, None
+
+def place_upload(upload):
+    """
+    Hands a finished .part file to the blob store with one rename and drops
+    the session, returning the stored name. Readers only ever see the
+    complete file. The session delete rides on the caller's commit.
+    """
+    sha256 = store_blob_file(part_path(upload), upload.filename, move=True)
+    db.session.delete(upload)
+    return blob_name(sha256, extension_of(upload.filename))
+
+def discard_upload(upload):
+    """Deletes a session and its .part file. Does not commit."""
+    if os.path.exists(part_path(upload)):
+        os.remove(part_path(upload))
+    db.session.delete(upload)
+
+@bp.cli.command('purge-uploads')
+def purge_uploads_command():
+    """Delete chunked uploads that have not received a chunk in UPLOAD_SESSION_HOURS."""
+    cutoff = datetime.utcnow() - timedelta(hours=current_app.config['UPLOAD_SESSION_HOURS'])
+    stale = UploadSession.query.filter(UploadSession.updated_at < cutoff).all()
+    for upload in stale:
+        discard_upload(upload)
+    db.session.commit()
+    click.echo(f'{len(stale)} abandoned upload(s) removed.')
@@ -32,8 +32,8 @@ class User(UserMixin, db.Model):
     membership_expiry = db.Column(db.DateTime, nullable=True)
     
     # Profile Customization
-    profile_photo = db.Column(db.String(500), default='https://placehold.co/150x150?text=User')
-    cover_photo = db.Column(db.String(500), default='https://placehold.co/800x300?text=Cover')
+    profile_photo = db.Column(db.String(500), default='/placeholders/avatar.svg')
+    cover_photo = db.Column(db.String(500), default='/placeholders/banner.svg')
 
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -78,7 +78,7 @@ class Book(db.Model):
     item_type = db.Column(db.String(20), default='hybrid') # circulation, sale, hybrid
     category = db.Column(db.String(50), default='General') # e.g. Fiction, Islamic, Bengali
     location = db.Column(db.String(100)) # e.g., "Aisle 3, Shelf B"
-    image_url = db.Column(db.String(500), default='https://placehold.co/200x300?text=No+Cover') # Poster URL
+    image_url = db.Column(db.String(500), default='/placeholders/cover.svg') # Poster URL
 
     
     # Stock Counters
@@ -87,9 +87,61 @@ class Book(db.Model):
     stock_borrowed = db.Column(db.Integer, default=0)
     stock_sold = db.Column(db.Integer, default=0)
 
+    # Optimistic locking: every ORM UPDATE checks and bumps this,
+    # set-based UPDATEs must bump it themselves
+    version_id = db.Column(db.Integer, nullable=False, default=1)
+    __mapper_args__ = {'version_id_col': version_id}
+
+    __table_args__ = (
+        # Bulk import dedupes on (title, author)
+        db.Index('ix_books_title_author', 'title', 'author'),
+        # Inventory grid filters and sorts
+        db.Index('ix_books_category', 'category'),
+        db.Index('ix_books_location', 'location'),
+        db.Index('ix_books_stock_available', 'stock_available'),
+        db.Index('ix_books_price', 'price'),
+        # Never hand a deleted book's id, and so its stock ledger, to a new book
+        {'sqlite_autoincrement': True},
+    )
+
     def __repr__(self):
         return f'<Book {self.title}>'
 
+class StockMovement(db.Model):
+    __tablename__ = 'stock_movements'
+    id = db.Column(db.Integer, primary_key=True)
+    book_id = db.Column(db.Integer, nullable=False) # No foreign key: the ledger outlives deleted books
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    reason = db.Column(db.String(20), nullable=False) # add, import, sale, loan, return, restock, supply, edit, delete
+    ref_id = db.Column(db.Integer, nullable=True) # e.g. SupplyOrder id for 'supply'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+
+    # Signed changes to the Book stock counters; rows are never updated
+    total_delta = db.Column(db.Integer, default=0)
+    available_delta = db.Column(db.Integer, default=0)
+    borrowed_delta = db.Column(db.Integer, default=0)
+    sold_delta = db.Column(db.Integer, default=0)
+
+    __table_args__ = (
+        db.Index('ix_stock_movements_book_id_created_at', 'book_id', 'created_at'),
+    )
+
+class StockSnapshot(db.Model):
+    __tablename__ = 'stock_snapshots'
+    id = db.Column(db.Integer, primary_key=True)
+    book_id = db.Column(db.Integer, nullable=False) # Kept with the movements when a book is deleted
+    taken_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_movement_id = db.Column(db.Integer, default=0) # Movements up to this id are included
+
+    stock_total = db.Column(db.Integer, default=0)
+    stock_available = db.Column(db.Integer, default=0)
+    stock_borrowed = db.Column(db.Integer, default=0)
+    stock_sold = db.Column(db.Integer, default=0)
+
+    __table_args__ = (
+        db.Index('ix_stock_snapshots_book_id_taken_at', 'book_id', 'taken_at'),
+    )
+
 class Cart(db.Model):
     __tablename__ = 'carts'
     id = db.Column(db.Integer, primary_key=True)
@@ -115,6 +167,14 @@ class Loan(db.Model):
     due_date = db.Column(db.DateTime)
     return_date = db.Column(db.DateTime, nullable=True)
     status = db.Column(db.String(20), default='active') # active, returned, overdue
+    reminder_sent_at = db.Column(db.DateTime, nullable=True) # Due-soon reminder queued
+
+    # The overdue sweeper range-scans this index, never the whole loan history
+    __table_args__ = (
+        db.Index('ix_loans_status_due_date', 'status', 'due_date'),
+        db.Index('ix_loans_book_id_status', 'book_id', 'status'),
+        db.Index('ix_loans_checkout_date', 'checkout_date'),
+    )
 
 class Sale(db.Model):
     __tablename__ = 'sales'
@@ -124,6 +184,29 @@ class Sale(db.Model):
     sale_date = db.Column(db.DateTime, default=datetime.utcnow)
     price_at_sale = db.Column(db.Float)
 
+    __table_args__ = (
+        db.Index('ix_sales_sale_date', 'sale_date'),
+        db.Index('ix_sales_book_id', 'book_id'),
+    )
+
+class MailOutbox(db.Model):
+    __tablename__ = 'mail_outbox'
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True) # NULL until delivered
+    attempts = db.Column(db.Integer, default=0)
+    # Optional single text attachment, e.g. a purchase-order CSV
+    attachment_name = db.Column(db.String(200), nullable=True)
+    attachment_type = db.Column(db.String(100), nullable=True)
+    attachment = db.Column(db.Text, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_mail_outbox_sent_at', 'sent_at'),
+    )
+
 class Discount(db.Model):
     __tablename__ = 'discounts'
     id = db.Column(db.Integer, primary_key=True)
@@ -154,9 +237,18 @@ class SupplyOrder(db.Model):
     # Statuses: 'shortlist', 'apply_gravity', 'pending_review', 'placed', 'completed'
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    placed_at = db.Column(db.DateTime, nullable=True) # Authorized and sent to the supplier
+    completed_at = db.Column(db.DateTime, nullable=True) # Received and fused into stock
     
     items = db.relationship('SupplyOrderItem', backref='order', lazy='dynamic', cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # At most one open shortlist at a time
+        db.Index('uq_supply_orders_shortlist', 'status', unique=True,
+                 sqlite_where=db.text("status = 'shortlist'"),
+                 postgresql_where=db.text("status = 'shortlist'")),
+    )
+
 class SupplyOrderItem(db.Model):
     __tablename__ = 'supply_order_items'
     id = db.Column(db.Integer, primary_key=True)
@@ -167,16 +259,149 @@ class SupplyOrderItem(db.Model):
     mass = db.Column(db.Integer, default=5) # Ordered Quantity
     payload = db.Column(db.Integer, nullable=True) # Received/Actual Quantity
 
+    __table_args__ = (
+        db.UniqueConstraint('order_id', 'book_id', name='uq_supply_order_items_order_book'),
+        db.Index('ix_supply_order_items_book_id', 'book_id'),
+    )
+
+class SupplierStats(db.Model):
+    """All-time order totals per supplier, kept up to date by analytics_utils."""
+    __tablename__ = 'supplier_stats'
+    supplier_id = db.Column(db.Integer, db.ForeignKey('suppliers.id'), primary_key=True)
+    supplier = db.relationship('Supplier')
+
+    # Bumped when an order is placed
+    orders_placed = db.Column(db.Integer, nullable=False, default=0)
+    units_ordered = db.Column(db.Integer, nullable=False, default=0)
+    spend = db.Column(db.Float, nullable=False, default=0.0) # Units ordered at list price
+    # Bumped when an order is completed
+    orders_completed = db.Column(db.Integer, nullable=False, default=0)
+    units_due = db.Column(db.Integer, nullable=False, default=0) # Units ordered on completed orders
+    units_received = db.Column(db.Integer, nullable=False, default=0)
+    lines_received = db.Column(db.Integer, nullable=False, default=0)
+    lines_short = db.Column(db.Integer, nullable=False, default=0) # Lines with payload below mass
+    lead_time_days = db.Column(db.Float, nullable=False, default=0.0) # Summed over completed orders
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class SupplierMonthlyStats(db.Model):
+    """The SupplierStats counters per calendar month (UTC) of placing or completing."""
+    __tablename__ = 'supplier_monthly_stats'
+    supplier_id = db.Column(db.Integer, db.ForeignKey('suppliers.id'), primary_key=True)
+    month = db.Column(db.Date, primary_key=True) # First day of the month
+
+    orders_placed = db.Column(db.Integer, nullable=False, default=0)
+    units_ordered = db.Column(db.Integer, nullable=False, default=0)
+    spend = db.Column(db.Float, nullable=False, default=0.0)
+    orders_completed = db.Column(db.Integer, nullable=False, default=0)
+    units_due = db.Column(db.Integer, nullable=False, default=0)
+    units_received = db.Column(db.Integer, nullable=False, default=0)
+    lines_received = db.Column(db.Integer, nullable=False, default=0)
+    lines_short = db.Column(db.Integer, nullable=False, default=0)
+    lead_time_days = db.Column(db.Float, nullable=False, default=0.0)
+
+class DemandForecast(db.Model):
+    """Per-book demand estimate, refreshed by `flask main forecast-demand`."""
+    __tablename__ = 'demand_forecasts'
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id'), primary_key=True)
+    rate = db.Column(db.Float, nullable=False, default=0.0) # Smoothed units per day (sales + loans)
+    variance = db.Column(db.Float, nullable=False, default=0.0) # Smoothed daily variance
+    reorder_point = db.Column(db.Integer, nullable=False)
+    suggested_qty = db.Column(db.Integer, nullable=False)
+    computed_through = db.Column(db.Date, nullable=False) # Last whole day folded into rate
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class EBook(db.Model):
     __tablename__ = 'ebooks'
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(140), nullable=False)
     author = db.Column(db.String(140), nullable=False)
     description = db.Column(db.Text)
-    cover_image_url = db.Column(db.String(500), default='https://placehold.co/200x300?text=No+Cover')
+    cover_image_url = db.Column(db.String(500), default='/placeholders/cover.svg')
     file_path = db.Column(db.String(500), nullable=False) # Path relative to static folder
     audio_path = db.Column(db.String(500), nullable=True) # Path to audio file
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
+    page_count = db.Column(db.Integer, nullable=True) # None until the page index is built
+    category = db.Column(db.String(50), nullable=True)
+
+    pages = db.relationship('EBookPage', backref='ebook', lazy='dynamic', cascade="all, delete-orphan",
+                            order_by='EBookPage.number')
+
+    __table_args__ = (
+        # E-library listing: newest first, keyset-paged on (uploaded_at, id), optionally within a category
+        db.Index('ix_ebooks_uploaded_at_id', 'uploaded_at', 'id'),
+        db.Index('ix_ebooks_category_uploaded_at_id', 'category', 'uploaded_at', 'id'),
+        # Author filter: a case-insensitive prefix range, see fetch_ebook_page
+        db.Index('ix_ebooks_author_lower', db.func.lower(db.text('author'))),
+    )
 
     def __repr__(self):
         return f'<EBook {self.title}>'
+
+class EBookPage(db.Model):
+    """One page of an e-book's PDF, indexed once by pdf_utils.build_page_index."""
+    __tablename__ = 'ebook_pages'
+    ebook_id = db.Column(db.Integer, db.ForeignKey('ebooks.id'), primary_key=True)
+    number = db.Column(db.Integer, primary_key=True) # 1-based
+    width = db.Column(db.Float, nullable=False) # PDF points, after page rotation
+    height = db.Column(db.Float, nullable=False)
+    text = db.Column(db.Text, nullable=True) # Extracted text, None until search-indexed
+
+class EBookTerm(db.Model):
+    """Inverted index over e-book page text, maintained by ebook_search_utils."""
+    __tablename__ = 'ebook_terms'
+    term = db.Column(db.String(64), primary_key=True) # Leading key: each query term is one index range
+    ebook_id = db.Column(db.Integer, db.ForeignKey('ebooks.id'), primary_key=True)
+    page = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False) # Occurrences on the page
+
+    __table_args__ = (
+        db.Index('ix_ebook_terms_ebook_page', 'ebook_id', 'page'),
+    )
+
+class UploadSession(db.Model):
+    """A resumable chunked upload of an e-book PDF or audio file; see upload_session_utils."""
+    __tablename__ = 'upload_sessions'
+    id = db.Column(db.String(32), primary_key=True) # Random token, also names the .part file
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    kind = db.Column(db.String(10), nullable=False) # 'pdf' or 'audio'
+    filename = db.Column(db.String(255), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    chunk_size = db.Column(db.Integer, nullable=False)
+    sha256 = db.Column(db.String(64), nullable=True) # Whole-file checksum, checked on completion if given
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    chunks = db.relationship('UploadChunk', backref='upload', lazy='dynamic', cascade="all, delete-orphan")
+
+    @property
+    def chunk_count(self):
+        return max(1, -(-self.size // self.chunk_size))
+
+    def chunk_length(self, index):
+        """Bytes expected in chunk `index`; only the last one may be short."""
+        return min(self.chunk_size, self.size - index * self.chunk_size)
+
+class UploadChunk(db.Model):
+    __tablename__ = 'upload_chunks'
+    upload_id = db.Column(db.String(32), db.ForeignKey('upload_sessions.id'), primary_key=True)
+    index = db.Column(db.Integer, primary_key=True) # 0-based
+    sha256 = db.Column(db.String(64), nullable=False)
+
+class Blob(db.Model):
+    """An uploaded file stored once under its SHA-256; see blob_utils."""
+    __tablename__ = 'blobs'
+    sha256 = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    content_type = db.Column(db.String(100), nullable=False)
+    refcount = db.Column(db.Integer, nullable=False, default=0) # E-books and users pointing at it
+    released_at = db.Column(db.DateTime, nullable=True) # When refcount last fell to zero
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ReadingProgress(db.Model):
+    """Where a user is in an e-book, written in batches by progress_utils."""
+    __tablename__ = 'reading_progress'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    ebook_id = db.Column(db.Integer, db.ForeignKey('ebooks.id'), primary_key=True)
+    page = db.Column(db.Integer, nullable=True) # Last page read in the PDF
+    position = db.Column(db.Float, nullable=True) # Seconds into the audiobook
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
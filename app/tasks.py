@@ -0,0 +1,30 @@
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+def _executor(app):
+    # One pool per app, created on first use so CLI commands never start threads
+    executor = app.extensions.get('tasks')
+    if executor is None:
+        executor = ThreadPoolExecutor(max_workers=app.config['BACKGROUND_WORKERS'],
+                                      thread_name_prefix='tasks')
+        app.extensions['tasks'] = executor
+    return executor
+
+def submit(fn, *args, **kwargs):
+    """
+    Runs fn(*args, **kwargs) on a background thread inside an app context,
+    so slow work such as building documents does not hold up the request.
+    Pass ids rather than model instances; the task opens its own session.
+    Returns the Future.
+    """
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                app.logger.exception(f"Background task {fn.__name__} failed")
+                raise
+
+    return _executor(app).submit(run)
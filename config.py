@@ -28,3 +28,42 @@ class Config:
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     ADMINS = [os.environ.get('MAIL_USERNAME') or 'your-email@example.com']
+
+    # Circulation
+    LOAN_REMINDER_DAYS = 2 # Remind borrowers this many days before the due date
+    LOAN_SWEEP_BATCH_SIZE = 500
+    MAIL_OUTBOX_BATCH_SIZE = 100
+    MAIL_OUTBOX_MAX_ATTEMPTS = 5
+
+    # Demand forecasting
+    FORECAST_HISTORY_DAYS = 180 # History replayed the first time a book is forecast
+    FORECAST_SMOOTHING = 0.1 # Weight of each new day in the moving average
+    FORECAST_LEAD_TIME_DAYS = 14 # Supplier delivery time
+    FORECAST_REVIEW_DAYS = 7 # How often orders go out; stock should last lead time + review
+    FORECAST_SERVICE_Z = 1.65 # Safety stock in standard deviations (~95% in-stock)
+    FORECAST_MIN_REORDER_POINT = 1 # Always shortlist a forecast book once it runs out
+
+    # Background work (app/tasks.py)
+    BACKGROUND_WORKERS = 2
+
+    # E-books and audiobooks live outside static/ so every byte goes through a login check
+    EBOOK_FOLDER = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'storage', 'ebooks')
+    EBOOK_MEDIA_MAX_AGE = 3600 # Seconds browsers may reuse a downloaded range (private cache only)
+    EBOOK_PAGE_PREFETCH = 3 # Pages cut ahead of the one asked for
+    AUDIO_SEEK_INTERVAL = 2 # Seconds between entries in an MP3 seek index
+    PROGRESS_FLUSH_SECONDS = 30 # Reading positions are buffered in memory and written this often
+    PROGRESS_BUFFER_MAX = 5000 # ...or as soon as this many readers have moved
+
+    # Chunked uploads of e-book PDFs and audio; each chunk stays under MAX_CONTENT_LENGTH
+    UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+    UPLOAD_MAX_SIZE = 2 * 1024 * 1024 * 1024 # 2GB per file
+    UPLOAD_SESSION_HOURS = 24 # Idle uploads removed by `flask main purge-uploads`
+
+    # Content-addressed store for e-book files, covers and profile photos (app/main/blob_utils.py)
+    BLOB_FOLDER = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'storage', 'blobs')
+    BLOB_MAX_AGE = 365 * 24 * 3600 # A hash URL never changes content, so caches may keep it a year
+    BLOB_GC_GRACE_HOURS = 24 # Unreferenced blobs kept this long before `flask main gc-blobs` deletes them
+    # Covers are rendered at these widths in pixels, as JPEG and WebP, for srcset (app/main/cover_utils.py)
+    COVER_WIDTHS = (160, 320, 640)
+    COVER_THUMB_WIDTH = 320 # The img src for browsers that ignore srcset; one of COVER_WIDTHS
+    PLACEHOLDER_MAX_AGE = 30 * 24 * 3600 # Covers and avatars drawn for rows without one (app/main/placeholder_utils.py)
@@ -0,0 +1,37 @@
+"""Use local placeholder images
+
+Revision ID: b7d2f5a8c416
+Revises: a4c7e1f9b362
+Create Date: 2026-10-20 00:12:05.648213
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2f5a8c416'
+down_revision = 'a4c7e1f9b362'
+branch_labels = None
+depends_on = None
+
+# (table, column, new default, old default)
+COLUMNS = (
+    ('books', 'image_url', '/placeholders/cover.svg', 'https://placehold.co/200x300?text=No+Cover'),
+    ('ebooks', 'cover_image_url', '/placeholders/cover.svg', 'https://placehold.co/200x300?text=No+Cover'),
+    ('users', 'profile_photo', '/placeholders/avatar.svg', 'https://placehold.co/150x150?text=User'),
+    ('users', 'cover_photo', '/placeholders/banner.svg', 'https://placehold.co/800x300?text=Cover'),
+)
+
+
+def upgrade():
+    # Data only: rows saved with a placehold.co default point at our own placeholders instead
+    for table, column, new, old in COLUMNS:
+        op.execute(sa.text(f"UPDATE {table} SET {column} = :new WHERE {column} LIKE 'https://placehold.co/%'")
+                   .bindparams(new=new))
+
+
+def downgrade():
+    for table, column, new, old in COLUMNS:
+        op.execute(sa.text(f"UPDATE {table} SET {column} = :old WHERE {column} = :new")
+                   .bindparams(new=new, old=old))
@@ -0,0 +1,30 @@
+"""Index e-book authors case-insensitively
+
+Revision ID: c5a9e3d7f214
+Revises: b7d2f5a8c416
+Create Date: 2026-10-20 10:12:37.508142
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5a9e3d7f214'
+down_revision = 'b7d2f5a8c416'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The author filter is a range on lower(author); a plain index on author
+    # could not serve it under SQLite's case-insensitive LIKE or a PostgreSQL locale
+    with op.batch_alter_table('ebooks', schema=None) as batch_op:
+        batch_op.drop_index('ix_ebooks_author')
+    op.create_index('ix_ebooks_author_lower', 'ebooks', [sa.text('lower(author)')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_ebooks_author_lower', table_name='ebooks')
+    with op.batch_alter_table('ebooks', schema=None) as batch_op:
+        batch_op.create_index('ix_ebooks_author', ['author'], unique=False)
@@ -0,0 +1,50 @@
+"""Keep the stock ledger of deleted books
+
+Revision ID: d4b8f2c6a917
+Revises: c5a9e3d7f214
+Create Date: 2026-10-20 11:03:52.271946
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4b8f2c6a917'
+down_revision = 'c5a9e3d7f214'
+branch_labels = None
+depends_on = None
+
+LEDGER_TABLES = ('stock_movements', 'stock_snapshots')
+# SQLite foreign keys have no name; batch mode rebuilds the table and names them by this
+NAMING_CONVENTION = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+
+
+def book_fk_name(table):
+    for fk in sa.inspect(op.get_bind()).get_foreign_keys(table):
+        if fk['constrained_columns'] == ['book_id']:
+            return fk['name'] or f'fk_{table}_book_id_books'
+    return None
+
+
+def upgrade():
+    # Movements and snapshots outlive the book they count
+    for table in LEDGER_TABLES:
+        name = book_fk_name(table)
+        if name:
+            with op.batch_alter_table(table, schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+                batch_op.drop_constraint(name, type_='foreignkey')
+
+    # ... so a new book must never be given a deleted book's id
+    with op.batch_alter_table('books', schema=None, recreate='auto',
+                              table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        if op.get_bind().dialect.name == 'sqlite':
+            batch_op.alter_column('id', existing_type=sa.Integer(), autoincrement=True)
+
+
+def downgrade():
+    for table in LEDGER_TABLES:
+        # Ledger rows of deleted books would break the restored constraint
+        op.execute(f"DELETE FROM {table} WHERE book_id NOT IN (SELECT id FROM books)")
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.create_foreign_key(f'fk_{table}_book_id_books', 'books', ['book_id'], ['id'])
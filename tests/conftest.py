@@ -0,0 +1,40 @@
+import pytest
+from app import create_app, db
+from app.models import User
+from config import Config
+
+
+class TestConfig(Config):
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+
+@pytest.fixture
+def app(tmp_path):
+    class Storage(TestConfig):
+        EBOOK_FOLDER = str(tmp_path / 'ebooks')
+        BLOB_FOLDER = str(tmp_path / 'blobs')
+
+    app = create_app(Storage)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def admin(app):
+    user = User(username='admin', email='admin@chupchappathshala.com', role='admin')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def admin_client(app, admin):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin.id)
+    return client
@@ -0,0 +1,26 @@
+import io
+import pytest
+from app.main.import_utils import MAX_RECORD_SIZE, iter_rows, validate_row
+
+
+def test_malformed_csv_is_a_value_error():
+    data = b'title,author\n"' + b'x' * 200000 + b'\n'
+    with pytest.raises(ValueError, match='Malformed CSV'):
+        list(iter_rows(io.BytesIO(data), 'books.csv'))
+
+
+def test_json_record_that_never_closes_is_a_value_error():
+    data = b'[{"title": "' + b'x' * (MAX_RECORD_SIZE * 2)
+    with pytest.raises(ValueError, match='never closes'):
+        list(iter_rows(io.BytesIO(data), 'books.json'))
+
+
+def test_import_page_reports_malformed_csv(admin_client):
+    data = {'file': (io.BytesIO(b'title,author\n"' + b'x' * 200000 + b'\n'), 'books.csv')}
+    response = admin_client.post('/inventory/import', data=data, content_type='multipart/form-data')
+    assert response.status_code == 302
+
+
+@pytest.mark.parametrize('price', ['nan', 'inf'])
+def test_rows_with_non_finite_prices_are_invalid(price):
+    assert validate_row({'title': 'T', 'author': 'A', 'price': price}) == (None, 'Price must be a finite number')
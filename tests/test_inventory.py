@@ -0,0 +1,14 @@
+import pytest
+from app.main.inventory_utils import parse_bulk_changes
+
+
+@pytest.mark.parametrize('price', ['nan', 'inf', '-inf', float('nan')])
+def test_bulk_changes_reject_non_finite_prices(price):
+    changes, errors = parse_bulk_changes([{'id': 1, 'price': price}])
+    assert changes == {}
+    assert errors == ['Row 1: Price must be a finite number']
+
+
+def test_bulk_changes_reject_overflowing_quantity():
+    changes, errors = parse_bulk_changes([{'id': 1, 'quantity': float('inf')}])
+    assert errors == ['Row 1: Quantity and price must be numbers']
@@ -0,0 +1,42 @@
+import io
+import wave
+from app import db
+from app.models import EBook
+from app.main.audio_utils import build_audio_index
+from app.main.blob_utils import blob_name, store_blob
+
+
+def stored_ebook(**files):
+    """An e-book whose files ({'file_path': ('a.pdf', bytes)}) sit in the blob store."""
+    values = {column: blob_name(store_blob(io.BytesIO(data), filename), filename.rsplit('.', 1)[-1])
+              for column, (filename, data) in files.items()}
+    ebook = EBook(title='Test', author='Author', **values)
+    db.session.add(ebook)
+    db.session.commit()
+    return ebook
+
+
+def test_blob_media_served_with_its_type(admin_client):
+    ebook = stored_ebook(file_path=('book.pdf', b'%PDF-1.4\n'))
+    response = admin_client.get(f'/ebooks/{ebook.id}/pdf')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/pdf'
+
+
+def wav_bytes(seconds=2, rate=8000):
+    out = io.BytesIO()
+    with wave.open(out, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(b'\0\0' * rate * seconds)
+    return out.getvalue()
+
+
+def test_blob_audio_segment_served_with_its_type(admin_client):
+    ebook = stored_ebook(file_path=('book.pdf', b'%PDF-1.4\n'), audio_path=('book.wav', wav_bytes()))
+    assert build_audio_index(ebook.id) == 2
+    response = admin_client.get(f'/ebooks/{ebook.id}/audio/segment?start=0&end=1')
+    assert response.status_code == 200
+    assert response.mimetype == 'audio/wav'
+    assert response.data[:4] == b'RIFF'
@@ -0,0 +1,26 @@
+import hashlib
+from app import db
+from app.models import Blob, UploadSession
+from app.main.upload_session_utils import ready_upload, place_upload
+
+
+def test_chunked_upload_keeps_extension_of_non_ascii_name(admin_client, admin):
+    body = b'%PDF-1.4\n' + b'x' * 100
+    sha256 = hashlib.sha256(body).hexdigest()
+
+    response = admin_client.post('/ebooks/uploads', json={
+        'kind': 'pdf', 'filename': 'বই.pdf', 'size': len(body), 'sha256': sha256,
+    })
+    assert response.status_code == 201
+    upload_id = response.get_json()['id']
+    assert db.session.get(UploadSession, upload_id).filename == 'upload.pdf'
+
+    response = admin_client.put(f'/ebooks/uploads/{upload_id}/chunks/0', data=body,
+                                headers={'X-Chunk-SHA256': sha256})
+    assert response.status_code == 200
+
+    upload, error = ready_upload(upload_id, 'pdf', admin.id)
+    assert error is None
+    assert place_upload(upload) == f'{sha256}.pdf'
+    db.session.commit()
+    assert db.session.get(Blob, sha256).content_type == 'application/pdf'